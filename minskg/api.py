@@ -1,16 +1,118 @@
 #!/usr/bin/env python3
 
-from flask import Flask, jsonify, request
+import functools
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, Response, g, jsonify, make_response, request
+from metrics import Counter, Gauge, Histogram, render
 from minskg import MinSKG
 
 app = Flask(__name__)
-minskg = MinSKG()
+minskg = MinSKG(backend=os.environ.get("MINSKG_BACKEND", "memory"), source=os.environ.get("MINSKG_SOURCE", "./minskg.ttl"))
+
+# SPARQL queries taking longer are logged together with their query text
+SLOW_QUERY_SECONDS = float(os.environ.get("MINSKG_SLOW_QUERY_SECONDS", 1.0))
+
+STATUS_CLASSES = ["1xx", "2xx", "3xx", "4xx", "5xx"]
+CACHES = ["content_snippet", "env_snippets", "query_results"]
+
+
+def conditional(view):
+    """
+    Adds the ETag and Last-Modified headers of the current MinSKG version to the responses
+    of the view and answers conditional requests with 304 without invoking the view if the
+    MinSKG did not change since. Only the ETag, i.e., the version in nanoseconds, is
+    validated, since Last-Modified has a resolution of seconds and would answer 304 for
+    builds within the same second. Requests with If-Modified-Since alone thus get a 200.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version = minskg.version
+        etag = str(version)
+        last_modified = datetime.fromtimestamp(version // 10**9, tz=timezone.utc)
+        not_modified = request.if_none_match.contains(etag)
+
+        response = Response(status=304) if not_modified else make_response(view(*args, **kwargs))
+        response.set_etag(etag)
+        response.last_modified = last_modified
+
+        return response
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=4096)
+def memoized_content_snippet(version, label, citation_key, contribution_iri) -> tuple:
+    """
+    Returns the content snippet and the contribution type of an import for a MinSKG version.
+    """
+
+    cache_misses.inc("content_snippet")
+
+    contribution_data = minskg.get_subgraph_for_subject(contribution_iri)
+    content_snippet = minskg.generate_content_snippet(label, citation_key, contribution_data)
+
+    return content_snippet, contribution_data["https://example.org/scikg/terms/type"]
+
+
+@functools.lru_cache(maxsize=8)
+def memoized_env_snippets(version) -> dict:
+    """
+    Returns the custom LaTeX environments for a MinSKG version.
+    """
+
+    cache_misses.inc("env_snippets")
+
+    return minskg.generate_env_snippets()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Counts the request per route and status class and records its latency.
+    """
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+
+    request_counts.inc(route, f"{response.status_code // 100}xx")
+    request_latencies.observe(time.perf_counter() - g.request_start_time, route)
+
+    return response
+
+
+@app.before_request
+def reload_minskg():
+    """
+    Picks up rebuilds of the MinSKG that were issued in other worker processes.
+    """
+
+    minskg.reload_if_changed()
+
 
 @app.route("/")
 def root():
     return "Hello from the MinSKG API."
 
 
+@app.route("/version")
+@conditional
+def scikg_version():
+    """
+    Returns the version of the MinSKG, against which clients validate their cached snippets.
+    """
+
+    return jsonify({"version": minskg.version}), 200
+
+
 @app.route("/build")
 def build():
     minskg.build()
@@ -19,18 +121,41 @@ def build():
 
 
 @app.route("/query")
+@conditional
 def query():
     """
-    Returns the subgraph where the specified subject is the root node.
+    Returns the result of the specified SPARQL query. If a subject is specified, the query
+    is a template whose ?subject variable is bound to the subject.
     """
 
     query = request.args.get("query")
-    query_result = minskg.query(query).serialize(format="ttl")
+    subject = request.args.get("subject")
+
+    cache_requests.inc("query_results")
+    query_result = minskg.cached_query(query, subject)
+
+    if query_result is not None:
+        return query_result.serialize(format="ttl"), 200
+
+    cache_misses.inc("query_results")
+
+    # the results of some queries are only evaluated on serialization, so it is timed, too
+    start_time = time.perf_counter()
+    query_result = minskg.query(query, subject).serialize(format="ttl")
+    query_time = time.perf_counter() - start_time
+
+    # only executed queries are observed, so that cache hits do not mask slow queries
+    query_latencies.observe(query_time)
+
+    if query_time >= SLOW_QUERY_SECONDS:
+        slow_queries.inc()
+        logging.warning(f"Slow SPARQL query took {query_time} seconds: {query}")
 
     return query_result, 200
 
 
 @app.route("/subgraph")
+@conditional
 def subgraph():
     """
     Returns the subgraph where the specified subject is the root node.
@@ -47,7 +172,24 @@ def subgraph():
     ), 200
 
 
+@app.route("/contributions")
+@conditional
+def contributions():
+    """
+    Returns the contributions of the specified publication.
+    """
+
+    publication = request.args.get("publication")
+
+    return jsonify(
+        {
+            "contributions": minskg.get_contributions_for_publication(publication),
+        }
+    ), 200
+
+
 @app.route("/content_snippet")
+@conditional
 def content_snippet():
     """
     Returns the content snippet.
@@ -57,28 +199,68 @@ def content_snippet():
     citation_key = request.args.get("citation_key")
     contribution_iri = request.args.get("contribution_iri")
 
-    contribution_data = minskg.get_subgraph_for_subject(contribution_iri)
-    content_snippet = minskg.generate_content_snippet(label, citation_key, contribution_data)
-    
+    cache_requests.inc("content_snippet")
+    content_snippet, contribution_type = memoized_content_snippet(minskg.version, label, citation_key, contribution_iri)
+
     return jsonify(
         {
             "content_snippet": content_snippet,
-            "contribution_type":  contribution_data["https://example.org/scikg/terms/type"]
+            "contribution_type": contribution_type
         }
     ), 200
 
 
+@app.route("/content_snippets", methods=["POST"])
+def content_snippets():
+    """
+    Returns the content snippets for a batch of imports. Errors are reported per import.
+    """
+
+    imports = request.json
+    results = []
+
+    for contribution_import in imports:
+        try:
+            cache_requests.inc("content_snippet")
+            content_snippet, contribution_type = memoized_content_snippet(
+                minskg.version, contribution_import["label"], contribution_import["citation_key"],
+                contribution_import["contribution_iri"])
+        except Exception as e:
+            results.append({"error": str(e)})
+            continue
+
+        results.append(
+            {
+                "content_snippet": content_snippet,
+                "contribution_type": contribution_type
+            }
+        )
+
+    return jsonify(results), 200
+
+
 @app.route("/env_snippets")
+@conditional
 def env_snippets():
     """
     Returns the custom LaTeX environments used for some snippets.
     """
 
-    env_snippets = minskg.generate_env_snippets()
+    cache_requests.inc("env_snippets")
+    env_snippets = memoized_env_snippets(minskg.version)
 
     return jsonify(env_snippets), 200
 
 
+@app.route("/contribution_schema")
+def contribution_schema():
+    """
+    Returns the supported contribution types and their required predicates.
+    """
+
+    return jsonify(minskg.get_contribution_schema()), 200
+
+
 @app.route("/validated_exports", methods=["POST"])
 def validated_exports():
     """
@@ -90,5 +272,37 @@ def validated_exports():
 
     return jsonify(validated_exports), 200
 
+
+@app.route("/metrics")
+def metrics():
+    """
+    Returns the metrics of all workers in the Prometheus text format.
+    """
+
+    return Response(render(all_metrics), mimetype="text/plain; version=0.0.4")
+
+
+# The metrics are allocated once all routes are registered and before gunicorn forks the
+# workers, so that they are shared by all workers.
+routes = sorted({rule.rule for rule in app.url_map.iter_rules()} | {"unmatched"})
+
+request_counts = Counter(
+    "minskg_requests_total", "Requests per route and status class.", {"route": routes, "status": STATUS_CLASSES})
+request_latencies = Histogram("minskg_request_duration_seconds", "Request latencies per route.", {"route": routes})
+query_latencies = Histogram(
+    "minskg_sparql_query_duration_seconds", "Execution times of uncached SPARQL queries including the serialization of the results.")
+slow_queries = Counter("minskg_sparql_slow_queries_total", f"SPARQL queries taking at least {SLOW_QUERY_SECONDS} seconds.")
+cache_requests = Counter("minskg_cache_requests_total", "Requests per cache.", {"cache": CACHES})
+cache_misses = Counter("minskg_cache_misses_total", "Cache misses per cache.", {"cache": CACHES})
+
+all_metrics = [
+    request_counts, request_latencies, query_latencies, slow_queries, cache_requests, cache_misses,
+    Gauge("minskg_triples", "Triples in the MinSKG.", lambda: len(minskg.skg)),
+    Gauge("minskg_contributions", "Indexed contributions in the MinSKG.", lambda: len(minskg.state.contributions or {})),
+    Gauge("minskg_version", "Version of the MinSKG, i.e., the modification time of its source in nanoseconds.",
+          lambda: minskg.version),
+]
+
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
+    # development server only, use gunicorn -c gunicorn.conf.py api:app for production
+    app.run(debug=os.environ.get("MINSKG_DEBUG") == "1", host="0.0.0.0", threaded=True)
@@ -0,0 +1,13 @@
+"""Gunicorn configuration for serving the MinSKG API with multiple workers."""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("MINSKG_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("MINSKG_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("MINSKG_THREADS", 4))
+worker_class = "gthread"
+
+# load the MinSKG once in the master process, so that the forked workers share the
+# read-only graph via copy-on-write
+preload_app = True
@@ -0,0 +1,133 @@
+"""Metrics module for exposing the statistics of the MinSKG API in the Prometheus text format."""
+
+import bisect
+import itertools
+import multiprocessing
+
+# upper bounds of the buckets of the latency histograms in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels) -> str:
+    labels = list(labels)
+
+    if not labels:
+        return ""
+
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for name, value in labels)
+
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) + "}"
+
+
+class Metric:
+    """
+    A metric with a fixed set of label values, whose values are kept in an array in shared
+    memory. Metrics created before gunicorn forks the workers (preload_app) are thus shared
+    by all workers, so that every worker updates and exposes the values of all workers.
+    """
+
+    def __init__(self, name, help, kind, labels: dict, slots_per_series) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = list(labels)
+        self.series = list(itertools.product(*labels.values()))
+        self.index = {label_values: ctr for ctr, label_values in enumerate(self.series)}
+        self.slots_per_series = slots_per_series
+        self.values = multiprocessing.Array("d", len(self.series) * slots_per_series)
+
+    def offset(self, label_values) -> int:
+        return self.index[label_values] * self.slots_per_series
+
+    def snapshot(self) -> list:
+        with self.values.get_lock():
+            return list(self.values)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+
+    def __init__(self, name, help, labels=None) -> None:
+        super().__init__(name, help, "counter", labels or {}, 1)
+
+    def inc(self, *label_values, amount=1) -> None:
+        offset = self.offset(label_values)
+
+        with self.values.get_lock():
+            self.values[offset] += amount
+
+    def render(self) -> list:
+        values = self.snapshot()
+
+        return super().render() + [
+            f"{self.name}{format_labels(zip(self.label_names, label_values))} {format_value(values[self.offset(label_values)])}"
+            for label_values in self.series]
+
+
+class Histogram(Metric):
+    """
+    A histogram that counts the observations per bucket, plus their sum and count.
+    """
+
+    def __init__(self, name, help, labels=None, buckets=LATENCY_BUCKETS) -> None:
+        self.buckets = list(buckets) + [float("inf")]
+        # one slot per bucket, the sum and the count
+        super().__init__(name, help, "histogram", labels or {}, len(self.buckets) + 2)
+
+    def observe(self, value, *label_values) -> None:
+        offset = self.offset(label_values)
+
+        with self.values.get_lock():
+            self.values[offset + bisect.bisect_left(self.buckets, value)] += 1
+            self.values[offset + len(self.buckets)] += value
+            self.values[offset + len(self.buckets) + 1] += 1
+
+    def render(self) -> list:
+        values = self.snapshot()
+        lines = super().render()
+
+        for label_values in self.series:
+            labels = list(zip(self.label_names, label_values))
+            offset = self.offset(label_values)
+            cumulative_count = 0
+
+            for ctr, bucket in enumerate(self.buckets):
+                cumulative_count += values[offset + ctr]
+                lines.append(f"{self.name}_bucket{format_labels(labels + [('le', format_value(bucket))])} {format_value(cumulative_count)}")
+
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(values[offset + len(self.buckets)])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {format_value(values[offset + len(self.buckets) + 1])}")
+
+        return lines
+
+
+class Gauge:
+    """
+    A gauge whose value is computed by the callback whenever the metrics are rendered.
+    """
+
+    def __init__(self, name, help, callback) -> None:
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {format_value(self.callback())}"]
+
+
+def render(metrics) -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format.
+    """
+
+    return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
@@ -1,27 +1,164 @@
 """MinSKG module."""
 
+import contextlib
+import functools
 import logging
+import os
 import re
+import tempfile
+import threading
 import uuid
+from collections import OrderedDict
+from typing import NamedTuple
 
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
 from pylatexenc.latex2text import LatexNodes2Text
 from rdflib import Graph, Literal, Namespace, URIRef
+from rdflib.plugins.sparql import prepareQuery
+from snapshot import adopt_mode, load_snapshot, source_stat, write_snapshot
+from sqlite_store import SQLiteStore
+
+# bump whenever the supported contributions or their predicates change
+CONTRIBUTION_SCHEMA_VERSION = 1
+
+# bump whenever the import into the SQLite store changes to reimport the existing stores
+SQLITE_IMPORT_VERSION = 2
+
+# maximum number of query results kept per worker process
+QUERY_CACHE_SIZE = 1024
+# maximum number of rows (triples of CONSTRUCT and DESCRIBE results) kept per worker process
+QUERY_CACHE_ROWS = 100000
+# results with more rows are not cached, so that a few large results do not evict all others
+QUERY_CACHE_MAX_RESULT_ROWS = 10000
+
+
+@functools.lru_cache(maxsize=256)
+def prepare_query(query: str, namespaces: tuple):
+    """
+    Returns the parsed and translated algebra of a SPARQL query, which is reused by all
+    executions of the query, e.g., of a template with different subjects. Like
+    Graph.query, the prefixes bound in the MinSKG can be used without declaring them.
+    """
+
+    return prepareQuery(query, initNs=dict(namespaces))
+
+
+class MinSKGState(NamedTuple):
+    """
+    An immutable state of the MinSKG that is swapped as a whole on rebuilds and reloads.
+    """
+
+    skg: Graph
+    contributions: dict
+    publication_contributions: dict
+    source: list
+    # prefixes bound in the graph as hashable (prefix, namespace) pairs
+    namespaces: tuple
+
 
 class MinSKG():
     """
     The class representing the MinSKG that is used to demonstrate RDFtex.
+
+    Requests read the current state once and keep using it, while build() and reloads
+    prepare a new state and swap it in atomically, so queries in flight are never affected.
     """
 
-    def __init__(self) -> None:
-        self.skg = Graph().parse("./minskg.ttl")
+    def __init__(self, backend="memory", source="./minskg.ttl") -> None:
+        self.backend = backend
+        # the snapshot and the SQLite store are kept next to the source, e.g., a generated SciKG
+        self.source = source
+        self.snapshot_path = f"{os.path.splitext(source)[0]}.snapshot"
+        self.sqlite_path = f"{os.path.splitext(source)[0]}.sqlite"
         self.terms = Namespace("https://example.org/scikg/terms/")
         self.publ = Namespace("https://example.org/scikg/publications/")
         self.supported_contributions = self.__get_supported_contributions()
+        self.lock = threading.Lock()
+        self.state = self.__load_state()
+        # results of recent queries keyed by the query, the subject and the MinSKG version
+        self.query_cache = OrderedDict()
+        self.query_cache_rows = 0
+        self.query_cache_lock = threading.Lock()
 
         logging.basicConfig(level=logging.INFO)
 
+    @property
+    def skg(self) -> Graph:
+        return self.state.skg
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the MinSKG, i.e., the modification time of its source in nanoseconds.
+        Every build bumps it and all worker processes agree on it.
+        """
+
+        return self.state.source[1]
+
+    def __load_state(self) -> MinSKGState:
+        source = source_stat(self.source)
+        skg = self.__load_graph()
+        contributions, publication_contributions = self.__build_index(skg)
+
+        if self.backend == "sqlite":
+            # connections are reopened lazily, so none is inherited by forked workers
+            skg.store.close()
+
+        return MinSKGState(skg, contributions, publication_contributions, source, self.__get_namespaces(skg))
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reloads the MinSKG if its source changed since it was loaded, e.g., because another
+        worker process rebuilt it. Returns whether the MinSKG was reloaded.
+        """
+
+        if source_stat(self.source) == self.state.source:
+            return False
+
+        with self.lock:
+            if source_stat(self.source) != self.state.source:
+                logging.info("MinSKG changed on disk -> Reloading...")
+                self.state = self.__load_state()
+                self.clear_query_cache()
+
+        return True
+
+    def __load_graph(self) -> Graph:
+        """
+        Loads the MinSKG using the configured storage backend. The memory backend loads the
+        binary snapshot and falls back to parsing the Turtle file if the snapshot is missing
+        or stale. The sqlite backend keeps the triples on disk and only imports the Turtle
+        file if it changed since the last import.
+        """
+
+        if self.backend == "sqlite":
+            skg = Graph(store=SQLiteStore(configuration=self.sqlite_path))
+
+            source = str([SQLITE_IMPORT_VERSION, *source_stat(self.source)])
+
+            if skg.store.get_meta("source") != source:
+                logging.info("Importing MinSKG into SQLite store...")
+
+                if not skg.store.replace_if_stale("source", source, lambda: Graph().parse(self.source)):
+                    logging.info("MinSKG already imported by another worker...")
+
+            return skg
+
+        if self.backend != "memory":
+            raise NotImplementedError("Only the memory and the sqlite backend are supported.")
+
+        skg = load_snapshot(self.snapshot_path, self.source)
+
+        if skg is None:
+            logging.info("Parsing MinSKG...")
+            skg = Graph().parse(self.source)
+
+            logging.info("Writing MinSKG snapshot...")
+            write_snapshot(skg, self.snapshot_path, self.source)
+
+        return skg
+
     def __get_supported_contributions(self):
         """
         Returns a dictionary of the supported contribution types and the respectively required predicates.
@@ -36,6 +173,54 @@ class MinSKG():
 
         return contribution_mapping
 
+    def __collect_subgraph(self, skg, subject) -> set:
+        """
+        Returns the triples of all nodes reachable from the subject as strings.
+        """
+
+        triples = set()
+        visited = {subject}
+        unvisited = [subject]
+
+        while unvisited:
+            node = unvisited.pop()
+
+            for predicate, obj in skg.predicate_objects(node):
+                triples.add((str(node), str(predicate), str(obj)))
+
+                if not isinstance(obj, Literal) and obj not in visited:
+                    visited.add(obj)
+                    unvisited.append(obj)
+
+        return triples
+
+    def __build_index(self, skg) -> tuple:
+        """
+        Returns a dictionary mapping each contribution IRI to the predicate/object dict of its
+        subgraph and a dictionary mapping each publication IRI to its contribution IRIs.
+        Contributions that lack a unique type are not indexed. The index is only built for
+        the memory backend since the sqlite backend is meant to keep the memory usage bounded.
+        """
+
+        contributions = {}
+        publication_contributions = {}
+
+        if self.backend != "memory":
+            return None, None
+
+        for publication, contribution in skg.subject_objects(self.terms["has_contribution"]):
+            publication_contributions.setdefault(str(publication), []).append(str(contribution))
+
+            triples = self.__collect_subgraph(skg, contribution)
+
+            if sum(predicate == str(self.terms["type"]) for _, predicate, _ in triples) == 1:
+                contributions[str(contribution)] = {predicate: obj for _, predicate, obj in triples}
+
+        for contribution_iris in publication_contributions.values():
+            contribution_iris.sort()
+
+        return contributions, publication_contributions
+
     def __populate_scikg(self, bib_data: dict) -> Graph:
 
         scikg = Graph()
@@ -183,9 +368,14 @@ class MinSKG():
 
     
     def __store_graph(self, graph, exportpath) -> None:
-        with open(exportpath, "w+") as file:
+        # replace the file atomically since other workers may reload it at any time
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(exportpath)))
+        with os.fdopen(file_descriptor, "w") as file:
             file.write(graph.serialize(format="ttl"))
 
+        adopt_mode(tmp_path, exportpath)
+        os.replace(tmp_path, exportpath)
+
     
     def __clean_snippet(self, snippet) -> str:
         snippet = re.sub(r" {2,}", "", snippet)
@@ -199,47 +389,136 @@ class MinSKG():
         Wrapper method for rebuilding the MinSKG.
         """
 
-        logging.info("Parsing bib file...")
-        parser = BibTexParser(common_strings=False)
-        parser.ignore_nonstandard_types = False
+        with self.lock:
+            logging.info("Parsing bib file...")
+            parser = BibTexParser(common_strings=False)
+            parser.ignore_nonstandard_types = False
+
+            with open("./minskg.bib") as bibtex_file:
+                bib_data = bibtexparser.load(bibtex_file, parser)
+
+            logging.info("Building MinSKG...")
+            skg = self.__populate_scikg(bib_data.entries)
 
-        with open("./minskg.bib") as bibtex_file:
-            bib_data = bibtexparser.load(bibtex_file, parser)
+            logging.info("Storing MinSKG...")
+            self.__store_graph(skg, self.source)
+            source = source_stat(self.source)
 
-        logging.info("Building MinSKG...")
-        self.skg = self.__populate_scikg(bib_data.entries)
+            if self.backend == "sqlite":
+                # skipped if another worker already imported the new source on reload
+                self.skg.store.replace_if_stale("source", str([SQLITE_IMPORT_VERSION, *source]), lambda: skg)
+                skg = self.skg
+            else:
+                write_snapshot(skg, self.snapshot_path, self.source)
 
-        logging.info("Storing MinSKG...")
-        self.__store_graph(self.skg, "./minskg.ttl")
+            logging.info("Indexing MinSKG...")
+            contributions, publication_contributions = self.__build_index(skg)
 
+            self.state = MinSKGState(skg, contributions, publication_contributions, source, self.__get_namespaces(skg))
+            self.clear_query_cache()
 
-    def query(self, query: str) -> str:
+    def __reading(self, skg):
         """
-        Executes a SPARQL query on the MinSKG and returns the result
+        Returns the context for reading the graph consistently. The sqlite backend reads within
+        a transaction, since other workers may replace the triples of the shared store at any
+        time, whereas the graphs of the memory backend are never modified once swapped in.
         """
 
-        query_result = self.skg.query(query)
+        return skg.store.read_transaction() if self.backend == "sqlite" else contextlib.nullcontext()
+
+    def __get_namespaces(self, skg) -> tuple:
+        return tuple(sorted((prefix, str(namespace)) for prefix, namespace in skg.namespaces()))
+
+    def clear_query_cache(self) -> None:
+        with self.query_cache_lock:
+            self.query_cache.clear()
+            self.query_cache_rows = 0
+
+    def cached_query(self, query: str, subject=None):
+        """
+        Returns the cached result of the query for the current MinSKG version or None.
+        """
+
+        key = (query, subject, self.version)
+
+        with self.query_cache_lock:
+            query_result = self.query_cache.get(key)
+
+            if query_result is not None:
+                self.query_cache.move_to_end(key)
 
         return query_result
 
+    def query(self, query: str, subject=None):
+        """
+        Executes a SPARQL query on the MinSKG and returns the result. If a subject is
+        specified, the query is a template whose ?subject variable is bound to it, so that
+        the prepared query is reused for all subjects. Results are kept in an LRU cache that
+        is bounded by the number of results and their rows and is invalidated whenever the
+        MinSKG changes.
+        """
+
+        state = self.state
+        query_result = self.cached_query(query, subject)
 
-    def get_subgraph_for_subject(self, subject: str) -> str:
+        if query_result is not None:
+            return query_result
+
+        init_bindings = {"subject": URIRef(subject)} if subject is not None else None
+        with self.__reading(state.skg):
+            query_result = state.skg.query(prepare_query(query, state.namespaces), initBindings=init_bindings)
+
+            if query_result.type == "SELECT":
+                # evaluate the lazily evaluated bindings, so that the cached result can be iterated repeatedly
+                query_result.bindings
+
+        rows = len(query_result)
+
+        if rows > QUERY_CACHE_MAX_RESULT_ROWS:
+            return query_result
+
+        with self.query_cache_lock:
+            key = (query, subject, state.source[1])
+            previous_result = self.query_cache.pop(key, None)
+
+            if previous_result is not None:
+                self.query_cache_rows -= len(previous_result)
+
+            self.query_cache[key] = query_result
+            self.query_cache_rows += rows
+
+            while len(self.query_cache) > QUERY_CACHE_SIZE or self.query_cache_rows > QUERY_CACHE_ROWS:
+                self.query_cache_rows -= len(self.query_cache.popitem(last=False)[1])
+
+        return query_result
+
+
+    def get_contributions_for_publication(self, publication: str) -> list:
         """
-        Returns the subgraph where the specified subject is the root node.
+        Returns the IRIs of the contributions of the specified publication.
         """
 
-        query = f"""
-        prefix x: <urn:ex:>
+        state = self.state
 
-        construct {{?s ?p ?o}}
-        where {{
-          <{subject}> (x:|!x:)* ?s .
-          ?s ?p ?o .
-        }}
+        if state.publication_contributions is None:
+            with self.__reading(state.skg):
+                return sorted(str(contribution) for contribution in state.skg.objects(URIRef(publication), self.terms["has_contribution"]))
+
+        return list(state.publication_contributions.get(publication, []))
+
+    def get_subgraph_for_subject(self, subject: str) -> str:
         """
+        Returns the subgraph where the specified subject is the root node. Contributions are
+        looked up in the index, other subjects are traversed using the store's indexes.
+        """
+
+        state = self.state
+
+        if state.contributions and subject in state.contributions:
+            return dict(state.contributions[subject])
 
-        result = self.skg.query(query)
-        triples = list({(str(s), str(p), str(o)) for s, p, o in result})
+        with self.__reading(state.skg):
+            triples = self.__collect_subgraph(state.skg, URIRef(subject))
 
         import_triples = list(filter(lambda x: x[1] == "https://example.org/scikg/terms/type", triples))
 
@@ -249,7 +528,6 @@ class MinSKG():
         contribution_data = {triple[1]: triple[2] for triple in triples}
 
         return contribution_data
-    
 
     def generate_content_snippet(self, label, citation_key, contribution_data) -> str:
         """
@@ -369,6 +647,20 @@ class MinSKG():
         return custom_envs
     
 
+    def get_contribution_schema(self) -> dict:
+        """
+        Returns the supported contribution types and their required predicates, so that
+        clients can validate exports locally.
+        """
+
+        return {
+            "version": CONTRIBUTION_SCHEMA_VERSION,
+            "contributions": {
+                contribution_type: [str(predicate) for predicate in predicates]
+                for contribution_type, predicates in self.supported_contributions.items()
+            },
+        }
+
     def validate_exports(self, exports):
         validated_exports = dict(filter(lambda export: self.__validate_export(*export), exports.items()))
 
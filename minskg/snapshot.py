@@ -0,0 +1,166 @@
+"""Binary snapshot module for fast loading of the MinSKG."""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+# Layout: magic, length of the JSON metadata, JSON metadata padded to 8 bytes, term offsets
+# (uint64), triples as interned term ids (uint32), term kinds (uint8) and the UTF-8 term blob.
+MAGIC = b"MSKGSNP1"
+HEADER = struct.Struct("<8sQ")
+
+URIREF_KIND = 0
+BNODE_KIND = 1
+LITERAL_KIND = 2
+
+
+def read_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+
+    return umask
+
+
+# mode of new files, read once since reading the umask briefly resets it for all threads
+DEFAULT_FILE_MODE = 0o666 & ~read_umask()
+
+
+def source_stat(source_path) -> list:
+    stat = os.stat(source_path)
+
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def adopt_mode(tmp_path, path) -> None:
+    """
+    Gives a temporary file created by mkstemp (0600) the mode of the file it replaces or,
+    if there is none, the default mode of new files under the current umask.
+    """
+
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = DEFAULT_FILE_MODE
+
+    os.chmod(tmp_path, mode)
+
+
+def write_snapshot(graph: Graph, snapshot_path: str, source_path: str) -> None:
+    """
+    Writes a snapshot of the graph that is bound to the current state of the source file.
+    """
+
+    term_ids = {}
+    kinds = array("B")
+    offsets = array("Q", [0])
+    triples = array("I")
+    blob = bytearray()
+
+    for triple in graph:
+        for term in triple:
+            term_id = term_ids.get(term)
+
+            if term_id is None:
+                term_id = term_ids[term] = len(term_ids)
+
+                if isinstance(term, Literal):
+                    kinds.append(LITERAL_KIND)
+                    value = "\x00".join([str(term), term.datatype or "", term.language or ""])
+                else:
+                    kinds.append(BNODE_KIND if isinstance(term, BNode) else URIREF_KIND)
+                    value = str(term)
+
+                blob += value.encode("utf-8")
+                offsets.append(len(blob))
+
+            triples.append(term_id)
+
+    metadata = json.dumps({
+        "source": source_stat(source_path),
+        "terms": len(term_ids),
+        "triples": len(triples) // 3,
+        "namespaces": [[prefix, str(namespace)] for prefix, namespace in graph.namespaces()],
+    }).encode("utf-8")
+    metadata += b" " * (-len(metadata) % 8)
+
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(snapshot_path)))
+    with os.fdopen(file_descriptor, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(metadata)))
+        file.write(metadata)
+        file.write(offsets.tobytes())
+        file.write(triples.tobytes())
+        file.write(kinds.tobytes())
+        file.write(blob)
+
+    adopt_mode(tmp_path, snapshot_path)
+    os.replace(tmp_path, snapshot_path)
+
+
+def load_snapshot(snapshot_path: str, source_path: str):
+    """
+    Returns the graph stored in the snapshot or None if there is no snapshot or if it is
+    stale, i.e., the source file changed since the snapshot was written.
+    """
+
+    try:
+        file = open(snapshot_path, "rb")
+    except OSError:
+        return None
+
+    with file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as snapshot:
+        magic, metadata_length = HEADER.unpack_from(snapshot)
+
+        if magic != MAGIC:
+            return None
+
+        position = HEADER.size
+        metadata = json.loads(bytes(snapshot[position:position + metadata_length]))
+
+        if metadata["source"] != source_stat(source_path):
+            logging.info(f"Snapshot {snapshot_path} is stale...")
+            return None
+
+        view = memoryview(snapshot)
+        position += metadata_length
+
+        offsets = view[position:position + 8 * (metadata["terms"] + 1)].cast("Q")
+        position += offsets.nbytes
+        triples = view[position:position + 12 * metadata["triples"]].cast("I")
+        position += triples.nbytes
+        kinds = view[position:position + metadata["terms"]]
+        position += kinds.nbytes
+        blob = view[position:]
+
+        terms = []
+        for term_id, kind in enumerate(kinds):
+            value = str(blob[offsets[term_id]:offsets[term_id + 1]], "utf-8")
+
+            if kind == LITERAL_KIND:
+                lexical, datatype, language = value.split("\x00")
+                terms.append(Literal(lexical, lang=language or None, datatype=URIRef(datatype) if datatype else None))
+            elif kind == BNODE_KIND:
+                terms.append(BNode(value))
+            else:
+                terms.append(URIRef(value))
+
+        # the context-free store avoids the bookkeeping of the default store on every insert
+        graph = Graph(store="SimpleMemory")
+        for prefix, namespace in metadata["namespaces"]:
+            graph.bind(prefix, namespace, override=True)
+
+        add = graph.store.add
+        for index in range(0, len(triples), 3):
+            add((terms[triples[index]], terms[triples[index + 1]], terms[triples[index + 2]]), graph)
+
+        # release the exported buffers before the mmap is closed
+        for buffer in (offsets, triples, kinds, blob):
+            buffer.release()
+        view.release()
+
+    return graph
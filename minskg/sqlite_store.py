@@ -0,0 +1,315 @@
+"""SQLite-backed triple store module for the MinSKG."""
+
+import contextlib
+import sqlite3
+import threading
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.store import Store
+
+URIREF_KIND = 0
+BNODE_KIND = 1
+LITERAL_KIND = 2
+
+# upper bound for the number of cached terms to keep the memory usage bounded
+TERM_CACHE_SIZE = 100000
+
+# seconds to wait for another process to finish replacing the graph before giving up
+BUSY_TIMEOUT = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    datatype TEXT NOT NULL,
+    language TEXT NOT NULL,
+    UNIQUE (kind, value, datatype, language)
+);
+CREATE TABLE IF NOT EXISTS triples (
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    PRIMARY KEY (s, p, o)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pos ON triples (p, o, s);
+CREATE INDEX IF NOT EXISTS osp ON triples (o, s, p);
+CREATE TABLE IF NOT EXISTS namespaces (
+    prefix TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore(Store):
+    """
+    An rdflib store that keeps the triples on disk in SQLite tables with SPO, POS and OSP
+    indexes, so that the memory usage does not grow with the graph. Terms are interned as
+    integer ids. Every thread uses its own connection and the write-ahead log allows
+    queries to continue while the store is rebuilt.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None) -> None:
+        self.path = None
+        self.__local = threading.local()
+        self.__term_ids = {}
+        self.__terms = {}
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration, create=True) -> None:
+        self.path = configuration
+        connection = self.__connection()
+
+        with connection:
+            connection.executescript(SCHEMA)
+
+    def close(self, commit_pending_transaction=False) -> None:
+        connection = getattr(self.__local, "connection", None)
+
+        if connection is not None:
+            if commit_pending_transaction:
+                connection.commit()
+
+            connection.close()
+            self.__local.connection = None
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.__local.connection = connection
+
+        return connection
+
+    @staticmethod
+    def __encode(term) -> tuple:
+        if isinstance(term, Literal):
+            return LITERAL_KIND, str(term), str(term.datatype or ""), term.language or ""
+
+        return BNODE_KIND if isinstance(term, BNode) else URIREF_KIND, str(term), "", ""
+
+    @staticmethod
+    def __decode(kind, value, datatype, language):
+        if kind == LITERAL_KIND:
+            return Literal(value, lang=language or None, datatype=URIRef(datatype) if datatype else None)
+
+        return BNode(value) if kind == BNODE_KIND else URIRef(value)
+
+    def __cache(self, cache, key, value) -> None:
+        if len(cache) >= TERM_CACHE_SIZE:
+            cache.clear()
+
+        cache[key] = value
+
+    def __term_id(self, term, create=False):
+        """
+        Returns the id of the term or None if it is unknown and create is not set.
+        """
+
+        term_id = self.__term_ids.get(term)
+
+        if term_id is None:
+            encoded = self.__encode(term)
+            connection = self.__connection()
+
+            if create:
+                connection.execute(
+                    "INSERT OR IGNORE INTO terms (kind, value, datatype, language) VALUES (?, ?, ?, ?)", encoded)
+
+            row = connection.execute(
+                "SELECT id FROM terms WHERE kind = ? AND value = ? AND datatype = ? AND language = ?", encoded).fetchone()
+
+            if row is None:
+                return None
+
+            term_id = row[0]
+            self.__cache(self.__term_ids, term, term_id)
+
+        return term_id
+
+    def __term(self, term_id):
+        term = self.__terms.get(term_id)
+
+        if term is None:
+            row = self.__connection().execute(
+                "SELECT kind, value, datatype, language FROM terms WHERE id = ?", (term_id,)).fetchone()
+            term = self.__decode(*row)
+            self.__cache(self.__terms, term_id, term)
+
+        return term
+
+    def add(self, triple, context=None, quoted=False) -> None:
+        self.__connection().execute(
+            "INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)",
+            tuple(self.__term_id(term, create=True) for term in triple))
+        super().add(triple, context, quoted)
+
+    def addN(self, quads) -> None:
+        connection = self.__connection()
+        connection.executemany(
+            "INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)",
+            (tuple(self.__term_id(term, create=True) for term in (s, p, o)) for s, p, o, _ in quads))
+
+    def replace_if_stale(self, key, value, load) -> bool:
+        """
+        Replaces all triples and namespaces of the store by the ones of the graph returned by
+        load and sets the metadata key to the value, unless it already has the value. The
+        check and the replacement run in one write transaction, which SQLite serializes across
+        processes, so that workers noticing the same change wait for the first one and then
+        skip the import. Returns whether the triples were replaced. Readers see either the
+        previous or the new graph as long as they read within a read transaction (s.
+        read_transaction).
+        """
+
+        connection = self.__connection()
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+            if row is not None and row[0] == value:
+                connection.rollback()
+                return False
+
+            graph = load()
+            connection.execute("DELETE FROM triples")
+            connection.executemany(
+                "INSERT OR IGNORE INTO triples (s, p, o) VALUES (?, ?, ?)",
+                (tuple(self.__term_id(term, create=True) for term in triple) for triple in graph))
+            connection.execute("DELETE FROM namespaces")
+            connection.executemany(
+                "INSERT OR IGNORE INTO namespaces (prefix, namespace) VALUES (?, ?)",
+                ((prefix, str(namespace)) for prefix, namespace in graph.namespaces()))
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            # the cached ids of terms created within the transaction are void
+            self.__term_ids.clear()
+            self.__terms.clear()
+            raise
+
+        return True
+
+    @contextlib.contextmanager
+    def read_transaction(self):
+        """
+        Runs the reads of the current thread within a single transaction, so that all their
+        statements, e.g., of a SPARQL query, see the same snapshot of the write-ahead log, even
+        if the triples are replaced meanwhile. Nested read transactions join the outer one.
+        """
+
+        connection = self.__connection()
+
+        if connection.in_transaction:
+            yield
+            return
+
+        connection.execute("BEGIN")
+
+        try:
+            yield
+        finally:
+            connection.rollback()
+
+    def remove(self, triple_pattern, context=None) -> None:
+        for triple, _ in list(self.triples(triple_pattern, context)):
+            self.__connection().execute(
+                "DELETE FROM triples WHERE s = ? AND p = ? AND o = ?",
+                tuple(self.__term_id(term) for term in triple))
+            super().remove(triple, context)
+
+    def __where(self, triple_pattern):
+        """
+        Returns the WHERE clause and its parameters for the pattern or None if a bound term
+        is unknown, i.e., nothing can match.
+        """
+
+        clauses = []
+        params = []
+
+        for column, term in zip(("s", "p", "o"), triple_pattern):
+            if term is None:
+                continue
+
+            term_id = self.__term_id(term)
+
+            if term_id is None:
+                return None
+
+            clauses.append(f"{column} = ?")
+            params.append(term_id)
+
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def triples(self, triple_pattern, context=None):
+        where = self.__where(triple_pattern)
+
+        if where is None:
+            return
+
+        cursor = self.__connection().execute(f"SELECT s, p, o FROM triples{where[0]}", where[1])
+
+        for s, p, o in cursor:
+            yield (self.__term(s), self.__term(p), self.__term(o)), iter(())
+
+    def __len__(self, context=None) -> int:
+        return self.__connection().execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix, namespace, override=True, replace=False) -> None:
+        connection = self.__connection()
+
+        with connection:
+            if override or replace:
+                connection.execute("DELETE FROM namespaces WHERE prefix = ? OR namespace = ?", (prefix, str(namespace)))
+
+            connection.execute("INSERT OR IGNORE INTO namespaces (prefix, namespace) VALUES (?, ?)", (prefix, str(namespace)))
+
+    def namespace(self, prefix):
+        row = self.__connection().execute("SELECT namespace FROM namespaces WHERE prefix = ?", (prefix,)).fetchone()
+
+        return URIRef(row[0]) if row else None
+
+    def prefix(self, namespace):
+        row = self.__connection().execute("SELECT prefix FROM namespaces WHERE namespace = ?", (str(namespace),)).fetchone()
+
+        return row[0] if row else None
+
+    def namespaces(self):
+        for prefix, namespace in self.__connection().execute("SELECT prefix, namespace FROM namespaces").fetchall():
+            yield prefix, URIRef(namespace)
+
+    def get_meta(self, key):
+        """
+        Returns a value of the store's metadata, e.g., the state of the source it was loaded from.
+        """
+
+        row = self.__connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return row[0] if row else None
+
+    def set_meta(self, key, value) -> None:
+        connection = self.__connection()
+
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def commit(self) -> None:
+        self.__connection().commit()
+
+    def rollback(self) -> None:
+        self.__connection().rollback()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""Batch preprocessing module for many RDFtex projects."""
+
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import fire
+from constants import EXPORTS_COMPRESS, EXPORTS_FORMAT, IMPORT_CACHE_DIR, TEX_DIR
+from preprocessor import Preprocessor
+from snippet_cache import SnippetCache
+
+# import cache shared by all projects preprocessed in a worker process
+worker_snippet_cache = None
+
+
+def init_worker(cache_dir) -> None:
+    global worker_snippet_cache
+
+    logging.basicConfig(level=logging.INFO, format=f"%(levelname)s:{os.getpid()}:%(message)s", force=True)
+    worker_snippet_cache = SnippetCache(cache_dir) if cache_dir else None
+
+
+def preprocess_project(project_path, options) -> dict:
+    """
+    Preprocesses a single project and returns its summary. Failures are isolated per
+    project and reported in the summary.
+    """
+
+    start_time = time.time()
+
+    try:
+        # the projects are already preprocessed in parallel, so every project uses a single process
+        preprocessor = Preprocessor(project_path, worker_snippet_cache, max_workers=1)
+        preprocessor.run(**options)
+        summary = preprocessor.summary
+    except Exception as e:
+        logging.error(f"Preprocessing {project_path} failed: {e}")
+        summary = {"project": project_path, "error": f"{type(e).__name__}: {e}"}
+
+    summary["seconds"] = time.time() - start_time
+
+    return summary
+
+
+def batch(*projects, workers=None, cache_dir=f"{TEX_DIR}{IMPORT_CACHE_DIR}", output=None,
+          make_imports=True, make_exports=True, refresh=False, offline=False,
+          export_format=EXPORTS_FORMAT, compress_exports=EXPORTS_COMPRESS) -> None:
+    """
+    Preprocesses the projects specified as directories or glob patterns (e.g., "/tex/*")
+    in parallel with a pool of worker processes, one per core by default. Every worker
+    keeps its HTTP connections and an import cache, which is shared by all projects, warm
+    across projects; set cache_dir to "" to use the cache of each project instead.
+
+    A JSON summary with the timings, import/export counts and failures per project is
+    written to output or printed if no output is specified.
+    """
+
+    start_time = time.time()
+
+    project_paths = sorted({
+        os.path.abspath(path) for pattern in projects for path in glob.glob(pattern) if os.path.isdir(path)})
+
+    options = {
+        "make_imports": make_imports,
+        "make_exports": make_exports,
+        "refresh": refresh,
+        "offline": offline,
+        "export_format": export_format,
+        "compress_exports": compress_exports,
+    }
+
+    logging.info(f"Preprocessing {len(project_paths)} project(s)...")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_dir,)) as executor:
+        summaries = list(executor.map(preprocess_project, project_paths, repeat(options)))
+
+    report = {
+        "projects": summaries,
+        "failures": sum("error" in summary for summary in summaries),
+        "seconds": time.time() - start_time,
+    }
+
+    if output:
+        with open(output, "w+") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    logging.info(
+        f"Preprocessed {len(project_paths)} project(s) with {report['failures']} failure(s) in {report['seconds']} seconds!")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    fire.Fire(batch)
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """Benchmarking module."""
 
+import contextlib
+import csv
 import glob
+import json
 import logging
 import os
+import shutil
 import statistics
 import subprocess
+import sys
 import time
 
 import fire
@@ -13,7 +18,37 @@ import matplotlib.pyplot as plt
 from rdflib import Graph
 
 import scikg_adapter
-from constants import MAIN_TEX_FILE, PROJECT_DIR, TEX_DIR
+from constants import (IMPORT_CACHE_DIR, MAIN_TEX_FILE, MANIFEST_FILE, MAX_CONCURRENT_REQUESTS, PROJECT_DIR,
+                       TEX_DIR)
+from generator import generate_project, generate_scikg
+from preprocessor import Preprocessor
+from standin import LatencyModel, StandInSciKG, load_recordings, recording_key, store_recordings
+
+# phases of the preprocessing timed by the preprocessor
+PHASES = ["parse", "imports", "env_snippets", "validation", "serialization", "write"]
+
+# synthetic SciKG served by the MinSKG with MINSKG_SOURCE=./synthetic.ttl for the scaling benchmark
+SYNTHETIC_SCIKG_FILE = "../minskg/synthetic.ttl"
+
+# dependencies that should only be imported on the code paths that need them
+HEAVY_DEPENDENCIES = ["fire", "matplotlib", "multiprocessing", "rdflib", "requests", "watchdog"]
+
+# contribution entities queried by the response time benchmark
+RESPONSE_TIME_ENTITIES = {
+    "MinSKG": [
+        "https://example.org/scikg/publications/DBLP:conf/i-semantics/EhrlingerW16/contrib0",
+        "https://example.org/scikg/publications/DBLP:conf/amia/NoyCFKTVM03/contrib0",
+        "https://example.org/scikg/publications/DBLP:conf/emnlp/LuanHOH18/contrib0",
+    ],
+    "ORKG": [
+        "http://orkg.org/orkg/resource/R36110",
+        "http://orkg.org/orkg/resource/R368042",
+        "http://orkg.org/orkg/resource/R8199",
+    ],
+}
+
+# recorded responses of the SciKGs replayed by the stand-in SciKG
+RECORDINGS_DIR = "./benchmark-recordings"
 
 
 def runtime(runs=100):
@@ -93,65 +128,139 @@ def runtime(runs=100):
     fig.savefig(f"./benchmark-results/fig-benchmark-runtime-{PROJECT_DIR.replace('/', '')}-{runs}.pdf", bbox_inches="tight")
 
 
-def response_times(runs=100):
+def record(skg="ORKG"):
+    """
+    Records the responses of the SciKG to the queries of the response time benchmark, which
+    the stand-in SciKG replays. Requires access to the SciKG, so run it once online.
+    """
 
-    query_response_times = {
-        "MinSKG": {
-            "https://example.org/scikg/publications/DBLP:conf/i-semantics/EhrlingerW16/contrib0": [],
-            "https://example.org/scikg/publications/DBLP:conf/amia/NoyCFKTVM03/contrib0": [],
-            "https://example.org/scikg/publications/DBLP:conf/emnlp/LuanHOH18/contrib0": [],
-        },
-        "ORKG": {
-            "http://orkg.org/orkg/resource/R36110": [],
-            "http://orkg.org/orkg/resource/R368042": [],
-            "http://orkg.org/orkg/resource/R8199": [],
-        } 
-    }
+    recordings = {}
 
-    # query minskg
-    for ctr_one in range(runs):
-        for ctr_two, entity in enumerate(query_response_times["MinSKG"].keys()):
-            t1_start = time.perf_counter()
-            result = scikg_adapter.get_tree_for_contribution_entity(entity, "MinSKG")
-            t1_stop = time.perf_counter()
-            response_time = t1_stop - t1_start
+    for entity in RESPONSE_TIME_ENTITIES[skg]:
+        response = scikg_adapter.get_tree_for_contribution_entity(entity, skg)
+        recordings[recording_key(response.request.url)] = {
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", "text/plain"),
+            "body": response.text,
+        }
 
-            import random
-            response_time = random.randrange(13,15) * 0.005 + response_time
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    store_recordings(f"{RECORDINGS_DIR}/{skg}.json", recordings)
 
-            g = Graph()
-            g.parse(data=result.text)
+    logging.info(f"Recorded {len(recordings)} response(s) of the {skg}...")
 
-            query_response_times["MinSKG"][entity].append((len(g), response_time))
-            logging.info(f"Querying entity {ctr_two + 1} - Run {ctr_one + 1} from MinSKG took {response_time} seconds.")
 
-    # query orkg
-    for ctr_one in range(runs):
-        for ctr_two, entity in enumerate(query_response_times["ORKG"].keys()):
-            t1_start = time.perf_counter()
-            result = scikg_adapter.get_tree_for_contribution_entity(entity, "ORKG")
-            t1_stop = time.perf_counter()
-            response_time = t1_stop - t1_start
+def measure_response_times(skg, runs, concurrency) -> tuple:
+    """
+    Queries the contribution entities of the SciKG runs times each through the adapter with
+    the specified number of concurrent requests. Returns the response times and the number
+    of triples per entity, the number of failed requests, and the total runtime.
+    """
+
+    def timed_query(entity):
+        t1_start = time.perf_counter()
+        response = scikg_adapter.get_tree_for_contribution_entity(entity, skg)
+        t1_stop = time.perf_counter()
+
+        return entity, t1_stop - t1_start, response.text
+
+    entities = RESPONSE_TIME_ENTITIES[skg]
 
+    t1_start = time.perf_counter()
+    results = scikg_adapter.map_concurrently(timed_query, [entity for _ in range(runs) for entity in entities], concurrency)
+    t1_stop = time.perf_counter()
+
+    entity_response_times = {entity: [] for entity in entities}
+    triples = {}
+    failures = 0
+
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Querying the {skg} failed: {result}")
+            failures += 1
+            continue
+
+        entity, response_time, text = result
+        entity_response_times[entity].append(response_time)
+
+        if entity not in triples:
             g = Graph()
-            g.parse(data=result.text)
+            g.parse(data=text)
+            triples[entity] = len(g)
+
+    return entity_response_times, triples, failures, t1_stop - t1_start
+
 
-            query_response_times["ORKG"][entity].append((len(g), response_time))
-            logging.info(f"Querying entity {ctr_two + 1} - Run {ctr_one + 1} from ORKG took {response_time} seconds.")
-            time.sleep(3)
+def percentiles(values) -> dict:
+    if len(values) < 2:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]} if values else {"p50": None, "p95": None, "p99": None}
 
-    processed_results = {}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
 
-    for skg, entity_response_times in query_response_times.items():
-        processed_results[skg] = {}
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
 
-        ctr = 1
-        for entity, times in entity_response_times.items():
-            label = f"$E_{{M{ctr}}}$\n({times[0][0]})" if skg == "MinSKG" else f"$E_{{O{ctr}}}$\n({times[0][0]})"
-            processed_results[skg][label] = [time for _, time in times]
-            ctr += 1 
 
-    combined_results = processed_results["MinSKG"] | processed_results["ORKG"]
+def response_times(runs=100, concurrency=1, replay="ORKG", latency="lognormal", latency_mean=0.15, latency_spread=0.05, seed=0):
+    """
+    Captures the query response times of the SPARQL interfaces of the SciKGs through the
+    adapter, querying every contribution entity runs times with the specified number of
+    concurrent requests. The SciKGs listed in replay (e.g., "ORKG" or "MinSKG,ORKG") are
+    replaced by a local stand-in that replays their recorded responses (s. record) after a
+    latency drawn from the specified distribution (constant, uniform, normal, lognormal or
+    exponential with the mean and spread in seconds), so that the benchmark runs offline
+    and reproducibly. The other SciKGs are queried directly.
+
+    The p50/p95/p99 response times per entity and SciKG and the throughput per SciKG are
+    written as JSON and CSV files next to the plots.
+    """
+
+    replay = [replay] if isinstance(replay, str) else list(replay)
+    results = []
+    combined_results = {}
+
+    with contextlib.ExitStack() as stack:
+        for skg in RESPONSE_TIME_ENTITIES:
+            if skg in replay:
+                try:
+                    recordings = load_recordings(f"{RECORDINGS_DIR}/{skg}.json")
+                except OSError:
+                    logging.warning(f"No recorded responses of the {skg} found, run `python3 benchmark.py record --skg={skg}` first...")
+                    continue
+
+                stand_in = StandInSciKG(recordings, LatencyModel(latency, latency_mean, latency_spread, seed))
+                url = stack.enter_context(stand_in)
+                stack.callback(scikg_adapter.scikg_urls.__setitem__, skg, scikg_adapter.scikg_urls[skg])
+                scikg_adapter.scikg_urls[skg] = url
+
+            entity_response_times, triples, failures, seconds = measure_response_times(skg, runs, concurrency)
+            all_response_times = [response_time for times in entity_response_times.values() for response_time in times]
+
+            for ctr, (entity, times) in enumerate(entity_response_times.items()):
+                results.append({
+                    "skg": skg, "entity": entity, "triples": triples.get(entity), "requests": len(times), "failures": None,
+                    **percentiles(times), "mean": statistics.mean(times) if times else None, "throughput": None})
+
+                label = f"$E_{{M{ctr + 1}}}$" if skg == "MinSKG" else f"$E_{{O{ctr + 1}}}$"
+                combined_results[f"{label}\n({triples.get(entity)})"] = times
+
+            results.append({
+                "skg": skg, "entity": "all", "triples": None, "requests": len(all_response_times), "failures": failures,
+                **percentiles(all_response_times), "mean": statistics.mean(all_response_times) if all_response_times else None,
+                "throughput": len(all_response_times) / seconds})
+
+            logging.info(
+                f"Queried the {skg} {len(all_response_times)} time(s) with {concurrency} concurrent request(s): "
+                f"p50 {results[-1]['p50']}, p95 {results[-1]['p95']}, p99 {results[-1]['p99']} seconds, "
+                f"{results[-1]['throughput']} requests per second.")
+
+    if not results:
+        return
+
+    name = f"benchmark-response-{runs}-c{concurrency}"
+    write_results(name, {
+        "runs": runs, "concurrency": concurrency, "replay": replay, "latency": latency, "latency_mean": latency_mean,
+        "latency_spread": latency_spread, "seed": seed,
+    }, results)
 
     fig, ax = plt.subplots()
     boxplot = ax.boxplot(combined_results.values(), patch_artist=True, showfliers=False, medianprops={"color": "white"})
@@ -161,8 +270,237 @@ def response_times(runs=100):
     for patch in boxplot["boxes"]:
         patch.set_facecolor("black")
 
-    fig.savefig(f"./benchmark-results/fig-benchmark-response-{runs}.eps", bbox_inches="tight", format="eps")
-    fig.savefig(f"./benchmark-results/fig-benchmark-response-{runs}.pdf", bbox_inches="tight")
+    fig.savefig(f"./benchmark-results/fig-{name}.eps", bbox_inches="tight", format="eps")
+    fig.savefig(f"./benchmark-results/fig-{name}.pdf", bbox_inches="tight")
+
+
+def measure_phases(project_path, runs) -> list:
+    """
+    Preprocesses the project in-process with cold and warm caches and returns the runtime
+    of every phase per run. Cold runs start without any caches, warm runs reprocess all
+    files with populated import, schema and response caches. Informational logs are
+    suppressed during the runs.
+    """
+
+    results = []
+    log_level = logging.getLogger().level
+
+    for ctr in range(runs):
+        for mode in ("cold", "warm"):
+            if mode == "cold":
+                shutil.rmtree(os.path.dirname(f"{project_path}{IMPORT_CACHE_DIR}"), ignore_errors=True)
+                scikg_adapter.response_cache.clear()
+            else:
+                os.remove(f"{project_path}{MANIFEST_FILE}")
+
+            preprocessor = Preprocessor(project_path)
+
+            logging.getLogger().setLevel(logging.WARNING)
+            t1_start = time.perf_counter()
+            preprocessor.run()
+            t1_stop = time.perf_counter()
+            logging.getLogger().setLevel(log_level)
+
+            result = {"mode": mode, "run": ctr + 1}
+            result.update({phase: preprocessor.timings.get(phase, 0) for phase in PHASES})
+            result["total"] = t1_stop - t1_start
+            results.append(result)
+
+            logging.info(f"{mode} - Run {ctr + 1} completed. Preprocessing took {result['total']} seconds.")
+
+    return results
+
+
+def write_results(name, config, results) -> None:
+    """
+    Writes the results as JSON and CSV files to the benchmark-results folder.
+    """
+
+    with open(f"./benchmark-results/{name}.json", "w+") as file:
+        json.dump({"config": config, "results": results}, file, indent=2)
+
+    with open(f"./benchmark-results/{name}.csv", "w+", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def phases(lines=1000, imports=50, exports=50, properties=-1, prefixes=10, files=1, publications=100, contributions=500, runs=10):
+    """
+    Captures the runtime of the phases of the preprocessing (parsing, import resolution,
+    env snippet retrieval, export validation, export serialization and writing) in-process,
+    so that interpreter startup and imports are not measured, on a synthetic project of the
+    specified size. The imports refer to the synthetic SciKG of the specified size, which
+    the MinSKG has to serve (s. generator.py). The results are written as JSON and CSV next
+    to the plots.
+    """
+
+    project_path = f"{TEX_DIR}/benchmark-synthetic"
+    generate_project(project_path, lines, imports, exports, properties, prefixes, files, publications, contributions)
+
+    results = measure_phases(project_path, runs)
+
+    name = f"benchmark-phases-l{lines}-i{imports}-e{exports}-p{prefixes}-f{files}-{runs}"
+    write_results(name, {
+        "lines": lines, "imports": imports, "exports": exports, "properties": properties, "prefixes": prefixes,
+        "files": files, "publications": publications, "contributions": contributions, "runs": runs,
+    }, results)
+
+    # stacked bar chart of the average runtime per phase
+    fig, ax = plt.subplots()
+    modes = ["cold", "warm"]
+    bottom = [0 for _ in modes]
+
+    for phase in PHASES:
+        average_result = [statistics.mean([result[phase] for result in results if result["mode"] == mode]) for mode in modes]
+        ax.bar(modes, average_result, width=0.6, label=phase, edgecolor="black", bottom=bottom)
+        bottom = [b + w for b, w in zip(bottom, average_result)]
+
+    ax.set_ylabel("Seconds")
+    ax.legend(loc="upper right")
+
+    fig.savefig(f"./benchmark-results/fig-{name}.eps", bbox_inches="tight", format="eps")
+    fig.savefig(f"./benchmark-results/fig-{name}.pdf", bbox_inches="tight")
+
+
+def scaling(parameter="lines", values=(1000, 10000, 100000), runs=3, **sizes):
+    """
+    Sweeps one size parameter of the synthetic project or SciKG (lines, imports, exports,
+    properties, prefixes, files, publications or contributions) over the values, while the
+    other parameters keep their defaults of the phases benchmark or the values given as
+    options, and reports the scaling curves of the phases.
+
+    Sweeping publications or contributions regenerates the synthetic SciKG at
+    ../minskg/synthetic.ttl, which a MinSKG started with MINSKG_SOURCE=./synthetic.ttl
+    reloads on the next request.
+    """
+
+    config = {"lines": 1000, "imports": 50, "exports": 50, "properties": -1, "prefixes": 10, "files": 1,
+              "publications": 100, "contributions": 500}
+    config.update(sizes)
+
+    if parameter not in config:
+        raise ValueError(f"Unknown size parameter {parameter}")
+
+    project_path = f"{TEX_DIR}/benchmark-synthetic"
+    results = []
+
+    for value in values:
+        config[parameter] = value
+
+        if parameter in ("publications", "contributions"):
+            generate_scikg(SYNTHETIC_SCIKG_FILE, config["publications"], config["contributions"])
+
+            # let the MinSKG workers reload the SciKG before the measurements
+            scikg_adapter.map_concurrently(
+                lambda _: scikg_adapter.get_session().get(f"{scikg_adapter.scikg_urls['MinSKG']}/"), range(MAX_CONCURRENT_REQUESTS))
+
+        generate_project(project_path, **config)
+
+        for result in measure_phases(project_path, runs):
+            results.append({parameter: value, **result})
+
+        logging.info(f"{parameter}={value} completed.")
+
+    name = f"benchmark-scaling-{parameter}-{runs}"
+    write_results(name, {**config, parameter: list(values), "runs": runs}, results)
+
+    # average runtime per phase over the values of the parameter
+    fig, ax = plt.subplots()
+
+    for mode, linestyle in (("cold", "-"), ("warm", "--")):
+        for phase in PHASES + ["total"]:
+            average_result = [
+                statistics.mean([result[phase] for result in results if result["mode"] == mode and result[parameter] == value])
+                for value in values]
+            ax.plot(values, average_result, linestyle=linestyle, marker="o", label=f"{phase} ({mode})")
+
+    ax.set_xscale("log")
+    ax.set_xlabel(parameter.capitalize())
+    ax.set_ylabel("Seconds")
+    ax.legend(loc="upper left", fontsize="x-small", ncol=2)
+
+    fig.savefig(f"./benchmark-results/fig-{name}.eps", bbox_inches="tight", format="eps")
+    fig.savefig(f"./benchmark-results/fig-{name}.pdf", bbox_inches="tight")
+
+
+def measure_import_times(module) -> tuple:
+    """
+    Imports the module in a fresh interpreter with -X importtime. Returns the self and
+    cumulative import time in microseconds per imported module, the heavy dependencies
+    loaded by the import, and the wall-clock time of the interpreter.
+    """
+
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_DEPENDENCIES!r} if m in sys.modules))"
+
+    t1_start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    t1_stop = time.perf_counter()
+
+    import_times = {}
+
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        import_times[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return import_times, [m for m in process.stdout.strip().split(",") if m], t1_stop - t1_start
+
+
+def startup(module="preprocessor", runs=20, baseline=None, tolerance=0.3, min_microseconds=1000):
+    """
+    Tracks the startup time of the module, i.e., the time it takes to import it together
+    with its dependencies, based on python -X importtime in fresh interpreters. The median
+    self and cumulative import times of all imported modules and the heavy dependencies
+    (e.g., rdflib or watchdog) loaded by the import are written as JSON and CSV files to
+    the benchmark-results folder.
+
+    If baseline refers to the JSON file of a previous run, modules whose cumulative import
+    time grew by more than the tolerance and at least min_microseconds are reported and the
+    benchmark exits with status 1, so that import time regressions can be caught, e.g., in CI.
+    """
+
+    measurements = [measure_import_times(module) for _ in range(runs)]
+    heavy_dependencies = sorted({m for _, loaded, _ in measurements for m in loaded})
+    wall_time = statistics.median([seconds for _, _, seconds in measurements])
+
+    results = [{
+        "module": name,
+        "self_us": statistics.median([import_times.get(name, (0, 0))[0] for import_times, _, _ in measurements]),
+        "cumulative_us": statistics.median([import_times.get(name, (0, 0))[1] for import_times, _, _ in measurements]),
+    } for name in measurements[0][0]]
+
+    results.sort(key=lambda result: result["cumulative_us"], reverse=True)
+
+    name = f"benchmark-startup-{module}-{runs}"
+    write_results(name, {
+        "module": module, "runs": runs, "wall_seconds": wall_time, "heavy_dependencies": heavy_dependencies,
+    }, results)
+
+    module_time = next(result["cumulative_us"] for result in results if result["module"] == module)
+    logging.info(f"Importing {module} took {module_time / 1000} ms (interpreter: {wall_time} seconds).")
+
+    if heavy_dependencies:
+        logging.warning(f"Importing {module} loads the heavy dependencies {', '.join(heavy_dependencies)}...")
+
+    if baseline:
+        with open(baseline, "r") as file:
+            baseline_times = {result["module"]: result["cumulative_us"] for result in json.load(file)["results"]}
+
+        regressions = [
+            result for result in results
+            if result["cumulative_us"] > baseline_times.get(result["module"], 0) * (1 + tolerance)
+            and result["cumulative_us"] - baseline_times.get(result["module"], 0) >= min_microseconds]
+
+        for result in regressions:
+            logging.warning(
+                f"Import time regression of {result['module']}: {baseline_times.get(result['module'], 0) / 1000} ms "
+                f"-> {result['cumulative_us'] / 1000} ms")
+
+        if regressions:
+            sys.exit(1)
 
 
 if __name__ == "__main__":
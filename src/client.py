@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""Thin client module that issues runs of the preprocessor daemon (s. preprocessor.py serve)."""
+
+import ast
+import json
+import logging
+import socket
+import sys
+import time
+
+from constants import DAEMON_SOCKET_FILE, PROJECT_DIR, TEX_DIR
+
+
+def parse_options(args) -> dict:
+    """
+    Parses the options of a run given as --name=value, --name value or --name (True) like
+    the preprocessor's command line does, without importing fire.
+    """
+
+    options = {}
+    args = list(args)
+
+    while args:
+        arg = args.pop(0)
+
+        if not arg.startswith("--"):
+            raise ValueError(f"Unsupported argument {arg}")
+
+        name, has_value, value = arg[2:].partition("=")
+
+        if not has_value:
+            value = args.pop(0) if args and not args[0].startswith("--") else "True"
+
+        try:
+            options[name.replace("-", "_")] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            options[name.replace("-", "_")] = value
+
+    return options
+
+
+def request(message: dict, project_path=f"{TEX_DIR}{PROJECT_DIR}") -> dict:
+    """
+    Sends a request to the daemon of the project and returns its response. Raises an
+    OSError if no daemon is listening.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(f"{project_path}{DAEMON_SOCKET_FILE}")
+        client.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+        with client.makefile("r", encoding="utf-8") as file:
+            return json.loads(file.readline())
+
+
+def main(args) -> int:
+    """
+    Issues a run with the specified options on the daemon and returns the exit status.
+    Falls back to preprocessing in-process if no daemon is listening, so that builds
+    also work without the daemon. "stop" stops the daemon.
+    """
+
+    start_time = time.time()
+
+    if args[:1] == ["stop"]:
+        try:
+            request({"command": "stop"})
+        except OSError:
+            logging.info("No preprocessor daemon running...")
+
+        return 0
+
+    options = parse_options(args)
+
+    try:
+        response = request({"command": "run", "options": options})
+    except OSError:
+        logging.info("No preprocessor daemon running -> Preprocessing in-process...")
+
+        from preprocessor import Preprocessor
+        Preprocessor().run(**options)
+
+        return 0
+
+    if "error" in response:
+        logging.error(f"Preprocessing failed: {response['error']}")
+        return 1
+
+    summary = response["summary"]
+    logging.info(
+        f"Reprocessed {summary['reprocessed_files']} of {summary['files']} file(s) with the preprocessor daemon "
+        f"in {time.time() - start_time} seconds!")
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    sys.exit(main(sys.argv[1:]))
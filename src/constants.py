@@ -9,4 +9,52 @@ EXPORTS_SCIKG = "MinSKG"
 # PROJECT_DIR = "/your-project"
 # MAIN_TEX_FILE = PROJECT_DIR + "/main.tex"
 # EXPORTS_RDF_DOCUMENT_FILE = "/exports.ttl"
-# EXPORTS_SCIKG = "MinSKG"
\ No newline at end of file
+# EXPORTS_SCIKG = "MinSKG"
+
+# base URLs of the supported SciKGs
+SCIKG_URLS = {"MinSKG": "http://localhost:5000", "ORKG": "https://orkg.org"}
+
+# maximum number of concurrent requests and pooled connections per SciKG host
+MAX_CONCURRENT_REQUESTS = 8
+
+# persistent import cache stored in the project directory
+IMPORT_CACHE_DIR = "/.rdftex-cache/snippets"
+IMPORT_CACHE_TTL = 7 * 24 * 60 * 60
+IMPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# bump whenever the snippet templates change to invalidate cached snippets
+SNIPPET_TEMPLATE_VERSION = 1
+
+# state of the previous run used for incremental preprocessing
+MANIFEST_FILE = "/.rdftex-cache/manifest.json"
+# bump whenever the parsing of the RDFtex commands changes to discard the manifests of previous runs
+MANIFEST_VERSION = 3
+ROOT_CACHE_FILE = "/.rdftex-cache/root.tex"
+# line marking the position of the custom environments in the cached root file
+CUSTOM_ENVS_PLACEHOLDER = "% rdftex:custom-environments\n"
+
+# quiet period after the last file system event before the watch mode preprocesses
+WATCH_DEBOUNCE_SECONDS = 0.5
+
+# Unix socket in the project directory on which the preprocessor daemon accepts runs from the client
+DAEMON_SOCKET_FILE = "/.rdftex-cache/daemon.sock"
+
+# responses of the SciKGs kept for conditional requests across runs
+RESPONSE_CACHE_FILE = "/.rdftex-cache/responses.json"
+RESPONSE_CACHE_SIZE = 4096
+
+# format of the exports RDF document, either Turtle ("ttl") or N-Triples ("nt"), optionally gzip-compressed
+EXPORTS_FORMAT = "ttl"
+EXPORTS_COMPRESS = False
+
+# contribution schema of the exports SciKG used to validate exports locally
+CONTRIBUTION_SCHEMA_FILE = "/.rdftex-cache/schema.json"
+CONTRIBUTION_SCHEMA_VERSION = 1
+
+# worker processes for preprocessing the files of a project in parallel (None: one per core) and the
+# minimum amount of text to reprocess for which the parallel preprocessing outweighs its overhead
+MAX_PREPROCESSING_WORKERS = None
+PARALLEL_PREPROCESSING_MIN_CHARS = 1024 * 1024
+
+# report of the last run written next to the exports RDF document and cProfile profile captured on request
+RUN_REPORT_FILE = "/rdftex-report.json"
+PROFILE_FILE = "/.rdftex-cache/profile.pstats"
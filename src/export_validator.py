@@ -0,0 +1,66 @@
+"""Local validation module for exported contributions."""
+
+import logging
+
+TYPE_PREDICATE = "https://example.org/scikg/terms/type"
+
+
+class ExportValidator:
+    """
+    Validates exports against the contribution schema of a SciKG without contacting the
+    SciKG. The required predicates are precomputed as a frozenset per contribution type.
+    """
+
+    def __init__(self, schema: dict) -> None:
+        self.required_predicates = {
+            contribution_type: frozenset(predicates)
+            for contribution_type, predicates in schema["contributions"].items()
+        }
+
+    def problems(self, predicate_object_tuples) -> list:
+        """
+        Returns the descriptions of all problems of an export, i.e., an empty list if the
+        export is valid.
+        """
+
+        predicate_object_dict = {predicate: obj for predicate, obj in predicate_object_tuples}
+        export_type = predicate_object_dict.get(TYPE_PREDICATE)
+
+        if export_type is None:
+            return ["missing contribution type"]
+
+        required_predicates = self.required_predicates.get(export_type)
+
+        if required_predicates is None:
+            return [f"unsupported contribution type {export_type}"]
+
+        problems = []
+        missing_predicates = required_predicates.difference(predicate_object_dict)
+        extra_predicates = set(predicate_object_dict).difference(required_predicates)
+
+        if missing_predicates:
+            problems.append(f"missing predicates: {', '.join(sorted(missing_predicates))}")
+        if extra_predicates:
+            problems.append(f"unsupported predicates: {', '.join(sorted(extra_predicates))}")
+
+        return problems
+
+    def validate(self, exports: dict, export_sources=None) -> dict:
+        """
+        Returns the valid exports and logs the problems of the skipped ones together with
+        the source lines (e.g., exports.rdf.tex:12) of their commands.
+        """
+
+        validated_exports = {}
+
+        for export_name, predicate_object_tuples in exports.items():
+            problems = self.problems(predicate_object_tuples)
+
+            if problems:
+                sources = ", ".join((export_sources or {}).get(export_name, [])) or "unknown source"
+                logging.warning(
+                    f"Export of {export_name} ({sources}) is skipped due to {'; '.join(problems)}")
+            else:
+                validated_exports[export_name] = predicate_object_tuples
+
+        return validated_exports
@@ -0,0 +1,91 @@
+"""Streaming writer module for the exports RDF document."""
+
+import gzip
+
+from output_writer import AtomicWriter
+
+TERMS_NAMESPACE = "https://example.org/scikg/terms/"
+
+_LITERAL_ESCAPES = str.maketrans({"\\": "\\\\", "\"": "\\\"", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+# characters that are not allowed in IRIs of N-Triples and Turtle documents
+_IRI_ESCAPES = str.maketrans({char: f"\\u{ord(char):04X}" for char in "<>\"{}|^`\\ " + "".join(map(chr, range(0x21)))})
+
+
+def iri(value: str) -> str:
+    return f"<{value.translate(_IRI_ESCAPES)}>"
+
+
+def literal(value) -> str:
+    return f"\"{str(value).translate(_LITERAL_ESCAPES)}\""
+
+
+class ExportWriter:
+    """
+    Writes the exported contributions one at a time as N-Triples ("nt") or Turtle ("ttl"),
+    optionally gzip-compressed, instead of building the whole document in memory. The
+    document is written atomically and only replaces the target file if its content changed.
+    """
+
+    def __init__(self, path: str, export_format="ttl", compress=False) -> None:
+        if export_format not in ("nt", "ttl"):
+            raise NotImplementedError("Only N-Triples (nt) and Turtle (ttl) are supported as export formats.")
+
+        self.export_format = export_format
+        self.compress = compress
+        self.writer = AtomicWriter(path, binary=True)
+        self.file = None
+
+    @property
+    def changed(self) -> bool:
+        return self.writer.changed
+
+    def __enter__(self):
+        self.writer.__enter__()
+        self.file = self.writer.file
+
+        if self.compress:
+            # a fixed mtime keeps the compressed output byte-identical for identical content
+            self.file = gzip.GzipFile(fileobj=self.writer.file, mode="wb", mtime=0)
+
+        if self.export_format == "ttl":
+            self.__write(f"@prefix ns1: <{TERMS_NAMESPACE}> .\n\n")
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.compress:
+            self.file.close()
+
+        self.writer.__exit__(exc_type, exc_value, traceback)
+
+    def __write(self, text: str) -> None:
+        self.file.write(text.encode("utf-8"))
+
+    def add_contribution(self, publication_uri: str, contribution_uri: str, predicate_object_tuples) -> None:
+        """
+        Writes a contribution of the publication with its predicate/object tuples.
+        """
+
+        predicate_objects = [(self.__predicate(predicate), literal(obj)) for predicate, obj in predicate_object_tuples]
+
+        if self.export_format == "nt":
+            subject = iri(contribution_uri)
+            lines = [f"{iri(publication_uri)} {iri(TERMS_NAMESPACE + 'has_contribution')} {subject} .\n"]
+            lines += [f"{subject} {predicate} {obj} .\n" for predicate, obj in predicate_objects]
+        else:
+            lines = [f"{iri(publication_uri)} ns1:has_contribution {iri(contribution_uri)} .\n\n"]
+
+            if predicate_objects:
+                lines.append(iri(contribution_uri) + " " + " ;\n    ".join(
+                    f"{predicate} {obj}" for predicate, obj in predicate_objects) + " .\n\n")
+
+        self.__write("".join(lines))
+
+    def __predicate(self, predicate: str) -> str:
+        if self.export_format == "ttl" and predicate.startswith(TERMS_NAMESPACE):
+            local_name = predicate[len(TERMS_NAMESPACE):]
+
+            if local_name.replace("_", "").isalnum():
+                return f"ns1:{local_name}"
+
+        return iri(predicate)
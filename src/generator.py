@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""Generator module for synthetic SciKGs and RDFtex projects used for scale testing."""
+
+import logging
+import os
+import shutil
+
+import fire
+from export_writer import iri, literal
+
+TERMS = "https://example.org/scikg/terms/"
+PUBLICATIONS = "https://example.org/scikg/publications/"
+
+# properties of the contribution types supported by the MinSKG
+CONTRIBUTION_PROPERTIES = {
+    "Definition": ["definition_content"],
+    "Dataset": ["dataset_name", "dataset_domain", "dataset_description", "dataset_url"],
+    "Figure": ["figure_url", "figure_mime", "figure_description"],
+    "ExpResult": ["expresult_description", "expresult_result", "expresult_samplesize"],
+    "Software": ["software_name", "software_description", "software_url"],
+}
+CONTRIBUTION_TYPES = list(CONTRIBUTION_PROPERTIES)
+
+# file marking the directories of generated projects, which may be regenerated
+GENERATED_MARKER_FILE = "/.rdftex-generated"
+
+
+def contribution_id(ctr, publications) -> str:
+    """
+    Returns the id of the ctr-th synthetic contribution relative to the publications namespace.
+    The contributions are distributed round-robin across the publications.
+    """
+
+    return f"synthetic{ctr % publications}/contrib{ctr // publications}"
+
+
+def property_value(contribution_type, prop, ctr) -> str:
+    if prop.endswith("_url"):
+        return f"https://example.org/synthetic/{contribution_type.lower()}/{ctr}"
+    if prop == "figure_mime":
+        return "pdf"
+    if prop == "expresult_samplesize":
+        return str(100 + ctr)
+
+    return f"Synthetic {prop.replace('_', ' ')} of contribution {ctr}."
+
+
+def generate_scikg(path, publications=100, contributions=500) -> None:
+    """
+    Writes a synthetic MinSKG with the specified number of publications and contributions
+    to a Turtle file. The contributions cycle through all supported contribution types and
+    are distributed round-robin across the publications. Serve it with
+    MINSKG_SOURCE=<path> to benchmark the MinSKG and the imports at scale.
+    """
+
+    publications = max(publications, 1)
+
+    with open(path, "w+") as file:
+        for ctr in range(publications):
+            publication = f"{PUBLICATIONS}synthetic{ctr}"
+            meta = f"{publication}/meta"
+
+            file.write(
+                f"{iri(publication)} {iri(TERMS + 'has_meta_information')} {iri(meta)} .\n"
+                f"{iri(meta)} {iri(TERMS + 'has_title')} {literal(f'Synthetic publication {ctr}')} .\n"
+                f"{iri(meta)} {iri(TERMS + 'has_publication_year')} {literal(2000 + ctr % 25)} .\n"
+                f"{iri(meta)} {iri(TERMS + 'has_author')} {iri(f'https://example.org/scikg/authors/Author_{ctr}')} .\n")
+
+        for ctr in range(contributions):
+            contribution = f"{PUBLICATIONS}{contribution_id(ctr, publications)}"
+            contribution_type = CONTRIBUTION_TYPES[ctr % len(CONTRIBUTION_TYPES)]
+
+            lines = [
+                f"{iri(PUBLICATIONS + f'synthetic{ctr % publications}')} {iri(TERMS + 'has_contribution')} {iri(contribution)} .\n",
+                f"{iri(contribution)} {iri(TERMS + 'type')} {literal(contribution_type)} .\n",
+            ]
+            lines += [
+                f"{iri(contribution)} {iri(TERMS + prop)} {literal(property_value(contribution_type, prop, ctr))} .\n"
+                for prop in CONTRIBUTION_PROPERTIES[contribution_type]]
+
+            file.writelines(lines)
+
+    logging.info(f"Generated SciKG with {publications} publication(s) and {contributions} contribution(s) at {path}...")
+
+
+def generate_project(project_path, lines=1000, imports=50, exports=50, properties=-1, prefixes=10, files=1,
+                     publications=100, contributions=500) -> None:
+    """
+    Generates a synthetic RDFtex project with a root file defining the prefixes and the
+    specified number of chapter files that share the text lines, imports and exports.
+
+    The imports refer to the contributions of the synthetic SciKG with the specified size
+    and the exports cycle through all supported contribution types. Of the properties of
+    every export, the first properties (all if negative) are given by \\rdfproperty
+    commands in the text and the remaining ones as parameters of the \\rdfexport command.
+
+    An existing project is only replaced if it was generated, i.e., it holds the marker
+    file. Other non-empty directories are refused, so that real projects are never deleted.
+    """
+
+    if os.path.isdir(project_path) and os.listdir(project_path):
+        if not os.path.exists(f"{project_path}{GENERATED_MARKER_FILE}"):
+            raise FileExistsError(f"{project_path} is not empty and was not generated -> Refusing to replace it.")
+
+        shutil.rmtree(project_path)
+
+    os.makedirs(project_path, exist_ok=True)
+
+    with open(f"{project_path}{GENERATED_MARKER_FILE}", "w+") as file:
+        file.write("Generated by generator.py, which replaces this project on every run.\n")
+
+    prefix_lines = [
+        f"\\rdfprefix{{publ}}{{{PUBLICATIONS}}}\n",
+        f"\\rdfprefix{{mskg}}{{{TERMS}}}\n",
+    ]
+    prefix_lines += [f"\\rdfprefix{{voc{ctr}}}{{https://example.org/vocabularies/{ctr}/}}\n" for ctr in range(max(prefixes - 2, 0))]
+
+    with open(f"{project_path}/main.rdf.tex", "w+") as file:
+        file.write("\\documentclass{article}\n")
+        file.writelines(prefix_lines)
+        file.write("\\begin{document}\n")
+        file.writelines(f"\\input{{chapter{ctr}}}\n" for ctr in range(files))
+        file.write("\\end{document}\n")
+
+    for file_ctr in range(files):
+        file_imports = range(file_ctr, imports, files)
+        file_exports = range(file_ctr, exports, files)
+        file_lines = len(range(file_ctr, lines, files))
+        commands = {}
+
+        # spread the commands evenly across the lines of the file
+        for position, ctr in enumerate(file_imports):
+            commands.setdefault(position * file_lines // len(file_imports), []).append(
+                f"\\rdfimport{{import:{ctr}}}{{citation{ctr}}}"
+                f"{{publ:{contribution_id(ctr % max(contributions, 1), max(publications, 1))}}}{{MinSKG}}\n")
+
+        for position, ctr in enumerate(file_exports):
+            contribution_type = CONTRIBUTION_TYPES[ctr % len(CONTRIBUTION_TYPES)]
+            export_properties = CONTRIBUTION_PROPERTIES[contribution_type]
+            inline_properties = len(export_properties) if properties < 0 else properties
+
+            other_pred_obj = ",".join(
+                f"mskg:{prop}={property_value(contribution_type, prop, ctr)}" for prop in export_properties[inline_properties:])
+            export_lines = [f"\\rdfexport{{Export {ctr}}}{{{contribution_type}}}{{{other_pred_obj}}}\n"]
+            export_lines += [
+                f"Property: \\rdfproperty{{Export {ctr}}}{{mskg:{prop}}}{{{property_value(contribution_type, prop, ctr)}}}\n"
+                for prop in export_properties[:inline_properties]]
+
+            commands.setdefault(position * file_lines // len(file_exports), []).extend(export_lines)
+
+        with open(f"{project_path}/chapter{file_ctr}.rdf.tex", "w+") as file:
+            for line_ctr in range(file_lines):
+                file.writelines(commands.get(line_ctr, []))
+                file.write(f"Line {line_ctr} of the synthetic document with some text to tokenize.\n")
+
+    logging.info(f"Generated project with {lines} line(s), {imports} import(s) and {exports} export(s) at {project_path}...")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    fire.Fire({"scikg": generate_scikg, "project": generate_project})
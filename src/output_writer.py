@@ -0,0 +1,73 @@
+"""Atomic writer module for generated output files."""
+
+import os
+import uuid
+
+COMPARE_BLOCK_SIZE = 1 << 16
+
+
+class AtomicWriter:
+    """
+    Streams the content of an output file to a temporary file in the same directory, which
+    atomically replaces the output file once the content is complete. If the output file
+    already holds exactly the same content, it is left untouched, so that tools watching
+    the outputs (e.g., Latexmk) do not see unchanged files as modified.
+    """
+
+    def __init__(self, path: str, binary=False) -> None:
+        self.path = path
+        self.binary = binary
+        self.file = None
+        self.tmp_path = None
+        self.changed = False
+
+    def __enter__(self):
+        self.tmp_path = f"{os.path.abspath(self.path)}.{uuid.uuid4().hex}.tmp"
+        # unlike mkstemp (0600), the temporary file is created like open() does, i.e., 0666 minus the umask
+        file_descriptor = os.open(self.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+
+        self.file = os.fdopen(file_descriptor, "wb" if self.binary else "w")
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.file.close()
+
+        if exc_type is not None or self.__is_unchanged():
+            os.remove(self.tmp_path)
+        else:
+            self.__adopt_mode()
+            os.replace(self.tmp_path, self.path)
+            self.changed = True
+
+    def write(self, data) -> None:
+        self.file.write(data)
+
+    def writelines(self, chunks) -> None:
+        self.file.writelines(chunks)
+
+    def __adopt_mode(self) -> None:
+        """
+        Gives the temporary file the mode of the output file it replaces, if there is one.
+        """
+
+        try:
+            os.chmod(self.tmp_path, os.stat(self.path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+
+    def __is_unchanged(self) -> bool:
+        try:
+            if os.path.getsize(self.path) != os.path.getsize(self.tmp_path):
+                return False
+
+            with open(self.path, "rb") as current, open(self.tmp_path, "rb") as new:
+                while True:
+                    current_block, new_block = current.read(COMPARE_BLOCK_SIZE), new.read(COMPARE_BLOCK_SIZE)
+
+                    if current_block != new_block:
+                        return False
+                    if not current_block:
+                        return True
+        except OSError:
+            return False
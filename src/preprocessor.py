@@ -2,19 +2,29 @@
 
 """Preprocessor module."""
 
+import contextlib
 import glob
+import hashlib
+import json
 import logging
-import re
+import os
+import sys
+import threading
 import time
 import uuid
 
-import fire
-from constants import TEX_DIR, PROJECT_DIR, EXPORTS_RDF_DOCUMENT_FILE
-from rdflib import Graph, URIRef, Literal, Namespace
-from scikg_adapter import (retrieve_env_snippets, retrieve_content_snippet,
-                           retrieve_validated_exports)
-from watchdog.events import PatternMatchingEventHandler
-from watchdog.observers import Observer
+from constants import (TEX_DIR, PROJECT_DIR, EXPORTS_RDF_DOCUMENT_FILE, EXPORTS_FORMAT, EXPORTS_COMPRESS,
+                       CONTRIBUTION_SCHEMA_FILE, IMPORT_CACHE_DIR, MANIFEST_FILE, ROOT_CACHE_FILE,
+                       RESPONSE_CACHE_FILE, WATCH_DEBOUNCE_SECONDS, MAX_PREPROCESSING_WORKERS,
+                       PARALLEL_PREPROCESSING_MIN_CHARS, CUSTOM_ENVS_PLACEHOLDER, DAEMON_SOCKET_FILE,
+                       RUN_REPORT_FILE, PROFILE_FILE, MANIFEST_VERSION)
+from export_validator import ExportValidator
+from export_writer import ExportWriter
+from output_writer import AtomicWriter
+from scikg_adapter import (http_stats, load_response_cache, retrieve_contribution_schema, retrieve_env_snippets,
+                           retrieve_content_snippets, retrieve_scikg_version, store_response_cache)
+from snippet_cache import SnippetCache
+from tokenizer import DOCUMENT, EXPORT, IMPORT, PREFIX, PROPERTY, TEXT, compile_prefix_pattern, tokenize
 
 
 class Preprocessor:
@@ -22,62 +32,46 @@ class Preprocessor:
     RDFtex's preprocessor class.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, project_path=f"{TEX_DIR}{PROJECT_DIR}", snippet_cache=None,
+                 max_workers=MAX_PREPROCESSING_WORKERS) -> None:
+        self.project_path = project_path
+        self.max_workers = max_workers
         self.prefixes = {}
         self.exports = {}
-
-    def __parse_rdftex_command(self, substring: str) -> list:
+        self.export_sources = {}
+        # state kept warm between runs, e.g., in watch mode
+        self.manifest = None
+        self.manifest_mtime = None
+        self.snippet_cache = snippet_cache
+        # versions of the SciKGs retrieved in the current run
+        self.scikg_versions = {}
+        # summary, timings and counters of the last run, e.g., for batch preprocessing and benchmarks
+        self.summary = {}
+        self.timings = {}
+        self.command_timings = {}
+        self.counters = {}
+
+    def __resolve_iri(self, processed_file, iri) -> str:
         """
-        Parses the custom RDFtex commands and returns the parameters.
+        Expands an IRI in CURIE syntax (prefix:reference) if its prefix is in the scope of
+        the file. The pattern for the prefixes is only compiled if the scope changed.
         """
 
-        def resolve__prefix(string):
-            """
-            Replace parameters in prefix syntax by their full URIs
-            """
-            resolved = string
-
-            for prefix, written_out in self.prefixes.items():
-                if prefix + ":" in string:
-                    resolved = string.replace(prefix + ":", written_out)
-
-            return resolved
-
-        param_list = []
-        param_range = [0, 0]
-        bracket_counter = 0
-
-        index = 0
+        prefix_pattern = processed_file["prefix_pattern"]
 
-        for index, char in enumerate(substring):
-            if char == "{":
-                if not bracket_counter:
-                    param_range[0] = index + 1
-                bracket_counter += 1
+        if prefix_pattern is None:
+            prefix_pattern = processed_file["prefix_pattern"] = compile_prefix_pattern(tuple(processed_file["scope"]))
 
-            if char == "}":
-                bracket_counter -= 1
+        match = prefix_pattern.match(iri)
 
-                if not bracket_counter:
-                    param_range[1] = index
-                    param_list.append(substring[param_range[0]:param_range[1]])
+        return processed_file["scope"][match.group("prefix")] + iri[match.end():] if match else iri
 
-                    param_range = [0, 0]
-                    bracket_counter = 0
-
-                    if substring[index + 1] != "{":
-                        break
-
-        resolved_param_list = [resolve__prefix(param) for param in param_list]
-
-        return resolved_param_list, index + 1
-
-    def __handle_prefix(self, line) -> None:
+    def __handle_prefix(self, processed_file, token) -> None:
         """
-        Handles lines with the custom \\rdfprefix command.
+        Handles the custom \\rdfprefix command.
         """
 
-        param_list, _ = self.__parse_rdftex_command(line)
+        param_list = list(token.params)
 
         if len(param_list) != 2:
             logging.warning(
@@ -86,253 +80,730 @@ class Preprocessor:
 
         prefix, written_out, *_ = param_list
 
-        self.prefixes[prefix] = written_out
+        if prefix not in processed_file["scope"]:
+            processed_file["prefix_pattern"] = None
+
+        processed_file["scope"][prefix] = written_out
+        processed_file["prefixes"].append((prefix, written_out))
 
-    def __handle_import(self, processed_lines, imported_types, line, make_imports) -> None:
+    def __handle_import(self, processed_file, token, command, make_imports) -> None:
         """
-        Handles lines with the custom \\rdfimport command.
+        Handles the custom \\rdfimport command. The import is only collected here and a
+        placeholder chunk is reserved for its content snippet.
         """
 
         if not make_imports:
             return
-        
-        param_list, _ = self.__parse_rdftex_command(line)
+
+        param_list = list(token.params)
 
         if len(param_list) != 4:
             logging.warning(
                 f"RDFtex import commands require 4 parameters (got {len(param_list)}) -> Skipping import")
-            processed_lines.append(line)
+            processed_file["chunks"].append(command)
             return
 
         label, citation_key, contribution_iri, skg, *_ = param_list
+        contribution_iri = self.__resolve_iri(processed_file, contribution_iri)
 
-        try:
-            content_snippet, contribution_type = retrieve_content_snippet(label, citation_key, contribution_iri, skg)
-        except Exception as e:
-            logging.warning(
-                f"Skipping import due to error during snippet generation: {e}")
-            return
+        processed_file["imports"].append((len(processed_file["chunks"]), label, citation_key, contribution_iri, skg))
+        processed_file["chunks"].append("")
+
+    def __resolve_imports(self, pending_imports, snippet_cache, refresh, offline) -> int:
+        """
+        Serves the collected imports from the snippet cache where possible, retrieves the
+        remaining content snippets with one request per SciKG and splices them into the
+        reserved placeholder chunks. Files with failed imports are marked as incomplete.
+        Returns the number of failed imports.
+        """
+
+        failed_imports = 0
+
+        def splice(pending_imports_for_key, content_snippet, contribution_type):
+            for processed_file, chunk_index, *_ in pending_imports_for_key:
+                processed_file["chunks"][chunk_index] = content_snippet
+                processed_file["imported_types"].add(contribution_type)
+
+        def skip(pending_imports_for_key):
+            nonlocal failed_imports
+            failed_imports += len(pending_imports_for_key)
+
+            for processed_file, *_ in pending_imports_for_key:
+                processed_file["complete"] = False
+
+        imports_by_skg = {}
+        hits, misses = snippet_cache.hits, snippet_cache.misses
+
+        for pending_import in pending_imports:
+            *_, label, citation_key, contribution_iri, skg = pending_import
+            cache_key = snippet_cache.key(skg, contribution_iri, label, citation_key)
+            imports_by_skg.setdefault(skg, {}).setdefault(cache_key, []).append(pending_import)
+
+        for skg, skg_imports in imports_by_skg.items():
+            missing_keys = []
+            # snippets generated from an older version of the SciKG are retrieved again
+            version = self.__get_scikg_version(skg, offline)
+
+            for cache_key, pending_imports_for_key in skg_imports.items():
+                cached = None if refresh else snippet_cache.get(cache_key, allow_expired=offline, version=version)
+
+                if cached:
+                    splice(pending_imports_for_key, *cached)
+                elif offline:
+                    logging.warning(
+                        f"Skipping import of {pending_imports_for_key[0][4]} since it is not cached (offline mode)")
+                    skip(pending_imports_for_key)
+                else:
+                    missing_keys.append(cache_key)
+
+            if not missing_keys:
+                continue
+
+            logging.info(f"Retrieving {len(missing_keys)} content snippet(s) from {skg}...")
+
+            try:
+                results = retrieve_content_snippets(
+                    [skg_imports[cache_key][0][2:5] for cache_key in missing_keys], skg)
+            except Exception as e:
+                results = [e] * len(missing_keys)
+
+            for cache_key, result in zip(missing_keys, results):
+                if isinstance(result, Exception):
+                    logging.warning(
+                        f"Skipping import due to error during snippet generation: {result}")
+                    skip(skg_imports[cache_key])
+                    continue
+
+                snippet_cache.put(cache_key, *result, version=version)
+                splice(skg_imports[cache_key], *result)
+
+        logging.info(
+            f"Import cache: {snippet_cache.hits - hits} hit(s), {snippet_cache.misses - misses} miss(es)...")
+        self.__count("import_cache_hits", snippet_cache.hits - hits)
+        self.__count("import_cache_misses", snippet_cache.misses - misses)
+        snippet_cache.evict()
+
+        return failed_imports
 
-        imported_types.add(contribution_type)
-        processed_lines.append(content_snippet)
+    def __get_scikg_version(self, skg, offline):
+        """
+        Returns the version of the SciKG, which is retrieved once per run, or None if it is
+        unknown, e.g., since the SciKG is unreachable or does not expose its version.
+        """
+
+        if skg not in self.scikg_versions:
+            try:
+                self.scikg_versions[skg] = retrieve_scikg_version(skg, offline)
+            except Exception as e:
+                logging.warning(f"Could not retrieve the version of {skg}: {e} -> Not validating cached snippets")
+                self.scikg_versions[skg] = None
+
+        return self.scikg_versions[skg]
+
+    def __drop_outdated_files(self, files, offline) -> dict:
+        """
+        Returns the manifest entries of the files except the ones with imports retrieved from
+        an older version of their SciKG, so that these files are reprocessed after a rebuild.
+        """
+
+        return {
+            rdftexpath: file_entry for rdftexpath, file_entry in files.items()
+            if all(self.__get_scikg_version(skg, offline) in (None, version)
+                   for skg, version in file_entry["scikg_versions"].items())}
 
-    def __handle_export(self, processed_lines, line, make_exports) -> None:
+    def __handle_export(self, processed_file, token, command, make_exports) -> None:
         """
-        Handles lines with the custom \\rdfexport command.
+        Handles the custom \\rdfexport command.
         """
 
         if not make_exports:
             return
 
-        param_list, _ = self.__parse_rdftex_command(line)
+        param_list = list(token.params)
 
         if len(param_list) != 3:
             logging.warning(
-                f"RDFtex export commands require 2 parameters (got {len(param_list)}) -> Skipping export")
-            processed_lines.append(line)
+                f"RDFtex export commands require 3 parameters (got {len(param_list)}) -> Skipping export")
+            processed_file["chunks"].append(command)
             return
 
         export_name, export_type, other_pred_obj, *_ = param_list
+        exports = processed_file["exports"]
+        processed_file["export_lines"].setdefault(export_name, []).append(token.line)
 
-        if export_name in self.exports:
-            self.exports[export_name].append(
+        if export_name in exports:
+            exports[export_name].append(
                 ("https://example.org/scikg/terms/type", export_type))
         else:
-            self.exports[export_name] = [
+            exports[export_name] = [
                 ("https://example.org/scikg/terms/type", export_type)]
 
         if other_pred_obj:
-            other_pred_obj_exports = [tuple(pred_obj.split(
-                "=")) for pred_obj in other_pred_obj.split(",")]
+            # only the predicates are IRIs, the objects are literals
+            other_pred_obj_exports = []
 
-            self.exports[export_name] += other_pred_obj_exports
+            for pred_obj in other_pred_obj.split(","):
+                # the pairs may be separated by whitespace or span several lines
+                pred, _, obj = pred_obj.partition("=")
+                other_pred_obj_exports.append((self.__resolve_iri(processed_file, pred.strip()), obj.strip()))
 
-    def __handle_property(self, processed_lines, line, make_exports) -> None:
+            exports[export_name] += other_pred_obj_exports
+
+    def __handle_property(self, processed_file, token, command, make_exports) -> None:
         """
-        Handles lines with the custom \\rdfproperty command.
+        Handles the custom \\rdfproperty command.
         """
 
-        processed_line = ""
-        lastcommandendindex = 0
-        parsing_successful = True
+        param_list = list(token.params)
 
-        for match in re.finditer(r"\\rdfproperty", line):
+        if len(param_list) != 3:
+            logging.warning(
+                f"RDFtex property commands require 3 parameters (got {len(param_list)}) -> Skipping property")
+            processed_file["chunks"].append(command)
+            return
 
-            commandstartindex = match.start()
-            substring = line[commandstartindex:]
+        export_name, export_predicate, export_object, *_ = param_list
+        export_predicate = self.__resolve_iri(processed_file, export_predicate)
 
-            param_list, commandlength = self.__parse_rdftex_command(substring)
+        if make_exports:
 
-            if len(param_list) != 3:
+            # FIXME This workaround is only necessary for the RDFtex papers and can be removed later
+            # should be removable by adding a ~ in the .rdf.tex file
+            if export_object == "<object>":
                 logging.warning(
-                    f"RDFtex property commands require 3 parameters (got {len(param_list)}) -> Skipping property")
-                parsing_successful = False
-                break
+                    f"Found <object> as export_object (RDFtex workaround) -> Skipping")
+                processed_file["chunks"].append(command)
+                return
 
-            export_name, export_predicate, export_object, *_ = param_list
+            processed_file["exports"].setdefault(export_name, []).append((export_predicate, export_object))
+            processed_file["export_lines"].setdefault(export_name, []).append(token.line)
 
-            if make_exports:
+        processed_file["chunks"].append(export_object)
 
-                # FIXME This workaround is only necessary for the RDFtex papers and can be removed later
-                # should be removable by adding a ~ in the .rdf.tex file
-                if export_object == "<object>":
-                    logging.warning(
-                        f"Found <object> as export_object (RDFtex workaround) -> Skipping")
-                    parsing_successful = False
-                    break
-            
-                self.exports.setdefault(export_name, []).append((export_predicate, export_object))
-
-            processed_line += line[lastcommandendindex:
-                                   commandstartindex] + export_object
-            lastcommandendindex = commandstartindex + commandlength
-
-        if parsing_successful:
-            processed_line += line[lastcommandendindex:]
-            processed_lines.append(processed_line)
+    def preprocess_file(self, rdftexpath, text, prefixes, make_imports, make_exports) -> dict:
+        """
+        Tokenizes a file in a single pass and issues the processing of the custom RDFtex
+        commands in the scope of the specified global prefixes. Imports are only collected
+        and resolved later. The file is processed independently of all other files, so that
+        it can be processed by a worker process.
+        """
+
+        logging.info(f"Preprocessing {rdftexpath}...")
+
+        processed_file = {
+            "path": rdftexpath,
+            "scope": dict(prefixes),
+            "prefix_pattern": None,
+            "chunks": [],
+            "preamble_end_index": -1,
+            "prefixes": [],
+            "imports": [],
+            "exports": {},
+            "export_lines": {},
+            "imported_types": set(),
+            "complete": True,
+            "lines": text.count("\n") + 1 if text else 0,
+            "command_counts": {},
+            "command_seconds": {},
+        }
+        processed_chunks = processed_file["chunks"]
+        command_counts = processed_file["command_counts"]
+        command_seconds = processed_file["command_seconds"]
+
+        for token in tokenize(text):
+            command = text[token.start:token.end]
+
+            if token.kind == TEXT:
+                processed_chunks.append(command)
+                continue
+
+            start_time = time.perf_counter()
+
+            if token.kind == DOCUMENT and processed_file["preamble_end_index"] == -1:
+                # mark the end of the preamble for the injection of custom environments if needed
+                processed_file["preamble_end_index"] = len(processed_chunks)
+                processed_chunks.append(CUSTOM_ENVS_PLACEHOLDER)
+
+            elif token.kind == PREFIX:
+                logging.info(
+                    f"Handling rdfprefix command in line {token.line}...")
+
+                self.__handle_prefix(processed_file, token)
+
+            elif token.kind == IMPORT:
+                logging.info(
+                    f"Handling rdfimport command in line {token.line}...")
+
+                self.__handle_import(
+                    processed_file, token, command, make_imports)
+
+            elif token.kind == EXPORT:
+                logging.info(
+                    f"Handling rdfexport command in line {token.line}...")
+
+                self.__handle_export(processed_file, token, command, make_exports)
+
+            elif token.kind == PROPERTY:
+                logging.info(
+                    f"Handling rdfproperty command in line {token.line}...")
+
+                self.__handle_property(processed_file, token, command, make_exports)
+
+            command_counts[token.kind] = command_counts.get(token.kind, 0) + 1
+            command_seconds[token.kind] = command_seconds.get(token.kind, 0) + time.perf_counter() - start_time
+
+        del processed_file["scope"], processed_file["prefix_pattern"]
+
+        return processed_file
+
+    def __preprocess_files(self, rdftexpaths, texts, prefixes, previous_files, root_cache_path,
+                           make_imports, make_exports) -> tuple:
+        """
+        Preprocesses the files in the scope of the specified global prefixes and skips the
+        unchanged ones. The files are processed in parallel by worker processes if there is
+        enough text to outweigh their overhead. Returns the manifest entries of the skipped
+        files and the processed files by path.
+        """
+
+        prefixes_hash = self.__hash(json.dumps(sorted(prefixes.items())))
+        skipped_files = {}
+        changed_paths = []
+
+        for rdftexpath in rdftexpaths:
+            file_entry = previous_files.get(rdftexpath)
+
+            if (file_entry and file_entry["complete"] and file_entry["hash"] == self.__hash(texts[rdftexpath])
+                    and file_entry["prefixes_in"] == prefixes_hash
+                    and os.path.exists(rdftexpath.replace(".rdf.tex", ".tex"))
+                    and (not file_entry["root"] or os.path.exists(root_cache_path))):
+                logging.info(f"Skipping unchanged {rdftexpath}...")
+                skipped_files[rdftexpath] = file_entry
+            else:
+                changed_paths.append(rdftexpath)
+
+        args = [[rdftexpath for rdftexpath in changed_paths], [texts[rdftexpath] for rdftexpath in changed_paths],
+                [prefixes] * len(changed_paths), [make_imports] * len(changed_paths), [make_exports] * len(changed_paths)]
+
+        workers = min(self.max_workers or os.cpu_count() or 1, len(changed_paths))
+
+        if workers > 1 and sum(map(len, args[1])) >= PARALLEL_PREPROCESSING_MIN_CHARS:
+            logging.info(f"Preprocessing {len(changed_paths)} file(s) with {workers} worker processes...")
+
+            # multiprocessing is only imported if the files are preprocessed in parallel
+            from concurrent.futures import ProcessPoolExecutor
+
+            # a fresh preprocessor is sent to the workers instead of the state of this one
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                processed_files = list(executor.map(Preprocessor(self.project_path).preprocess_file, *args))
         else:
-            processed_lines.append(line)
+            processed_files = list(map(self.preprocess_file, *args))
+
+        for processed_file in processed_files:
+            processed_file.update({"hash": self.__hash(texts[processed_file["path"]]), "prefixes_in": prefixes_hash})
 
-    def __preprocess_file(self, rdftexpath, imported_types, make_imports, make_exports) -> None:
+        return skipped_files, {processed_file["path"]: processed_file for processed_file in processed_files}
+
+    def __merge_exports(self, rdftexpath, exports, export_lines) -> None:
         """
-        Scans files for custom RDFtex commands and issues their processing.
+        Merges the exports of a single file and the lines of their commands into the
+        exports of the project.
         """
 
-        preamble_end_index = -1
-        processed_lines = []
+        for export_name, predicate_object_tuples in exports.items():
+            self.exports.setdefault(export_name, []).extend(
+                tuple(predicate_object) for predicate_object in predicate_object_tuples)
 
-        with open(rdftexpath, "r") as file:
-            for linenumber, line in enumerate(file):
-                if "\\begin{document}" in line:
-                    # store preamble end index for insertion of custom environments if needed
-                    preamble_end_index = len(processed_lines)
+        for export_name, lines in export_lines.items():
+            self.export_sources.setdefault(export_name, []).extend(
+                f"{os.path.basename(rdftexpath)}:{line}" for line in lines)
 
-                if re.search(r"(?<! )\\rdfprefix", line):
-                    logging.info(
-                        f"Handling rdfprefix command in line {linenumber}...")
+    def __load_manifest(self, manifest_path, options) -> dict:
+        """
+        Loads the manifest of the previous run. The manifest kept in memory is reused if
+        the file was not changed since. A fresh manifest is returned if there is none or if
+        it was created with different options or by a previous version of the preprocessor.
+        """
 
-                    self.__handle_prefix(line)
+        try:
+            manifest_mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
+            manifest_mtime = None
 
-                elif re.search(r"(?<! )\\rdfimport", line):
-                    logging.info(
-                        f"Handling rdfimport command in line {linenumber}...")
+        if self.manifest and manifest_mtime == self.manifest_mtime and self.manifest["options"] == options:
+            return self.manifest
 
-                    self.__handle_import(
-                        processed_lines, imported_types, line, make_imports)
+        try:
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            manifest = {}
 
-                elif re.search(r"(?<! )\\rdfexport", line):
-                    logging.info(
-                        f"Handling rdfexport command in line {linenumber}...")
+        if manifest.get("options") != options or manifest.get("version") != MANIFEST_VERSION:
+            manifest = {
+                "version": MANIFEST_VERSION, "options": options, "publication": manifest.get("publication"), "files": {}}
 
-                    self.__handle_export(processed_lines, line, make_exports)
+        if not manifest["publication"]:
+            manifest["publication"] = uuid.uuid4().hex
 
-                elif re.search(r"\\rdfproperty", line):
-                    logging.info(
-                        f"Handling rdfproperty command(s) in line {linenumber}...")
+        return manifest
 
-                    self.__handle_property(processed_lines, line, make_exports)
+    @staticmethod
+    def __write_chunks(path, chunks) -> bool:
+        """
+        Streams the chunks to the specified path unless the file already holds exactly
+        this content, so that tools watching the outputs do not see unchanged files as modified.
+        """
 
-                else:
-                    processed_lines.append(line)
+        with AtomicWriter(path) as writer:
+            writer.writelines(chunks)
+
+        if not writer.changed:
+            logging.info(f"Skipping unchanged {path}...")
 
-        return preamble_end_index, processed_lines
+        return writer.changed
 
-    def run(self, make_imports=True, make_exports=True):
+    @contextlib.contextmanager
+    def __timed(self, phase):
+        """
+        Adds the time spent in the block to the timing of the phase.
+        """
+
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start_time
+
+    def __count(self, counter, amount=1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @staticmethod
+    def __hash(content) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def run(self, make_imports=True, make_exports=True, refresh=False, offline=False,
+            export_format=EXPORTS_FORMAT, compress_exports=EXPORTS_COMPRESS, profile=False):
         """
         Issues the preprocessing on every .rdf.tex file found in the specified project directory.
+        Imported snippets are cached in the project directory; refresh bypasses the cache
+        and offline serves imports only from the cache without contacting the SciKGs.
+        The exports are written as Turtle ("ttl") or N-Triples ("nt"), optionally gzip-compressed.
+
+        A manifest in the project directory records the content hash, defined prefixes,
+        exports and imported types per file, so that only changed files are reprocessed
+        and outputs are only written if their content changed.
+
+        Every run writes a JSON report with its summary, the timings of the phases and the
+        commands, and counters (e.g., scanned lines, import cache hits and the HTTP requests
+        per SciKG endpoint) next to the exports RDF document. profile additionally captures
+        a cProfile profile of the run in the .rdftex-cache folder of the project.
         """
-        
+
+        options = (make_imports, make_exports, refresh, offline, export_format, compress_exports)
+
+        if profile:
+            import cProfile
+
+            profile_path = f"{self.project_path}{PROFILE_FILE}"
+
+            with cProfile.Profile() as profiler:
+                self.__run(*options)
+
+            profiler.dump_stats(profile_path)
+            self.summary["profile"] = profile_path
+            logging.info(f"Profile written to {profile_path} (s. python3 -m pstats {profile_path})...")
+        else:
+            self.__run(*options)
+
+        with AtomicWriter(f"{self.project_path}{RUN_REPORT_FILE}") as file:
+            json.dump(self.summary, file, indent=2)
+
+    def __run(self, make_imports, make_exports, refresh, offline, export_format, compress_exports) -> None:
         start_time = time.time()
 
-        imported_types = set()
-        roottex_path = ""
-        roottex_lines = []
-        roottex_preamble_endindex = -1
+        project_path = self.project_path
+        manifest_path = f"{project_path}{MANIFEST_FILE}"
+        root_cache_path = f"{project_path}{ROOT_CACHE_FILE}"
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+
+        load_response_cache(f"{project_path}{RESPONSE_CACHE_FILE}")
 
-        for rdftexpath in glob.glob(f"{TEX_DIR}{PROJECT_DIR}/*.rdf.tex"):
-            logging.info(f"Preprocessing {rdftexpath}...")
-            preamble_end_index, processed_lines = self.__preprocess_file(rdftexpath, imported_types, make_imports, make_exports)
+        options = {"make_imports": bool(make_imports), "make_exports": bool(make_exports)}
+        manifest = self.__load_manifest(manifest_path, options)
+        http_stats_before = {endpoint: dict(stats) for endpoint, stats in http_stats.items()}
+        self.scikg_versions = {}
+        previous_files = {} if refresh else self.__drop_outdated_files(manifest["files"], offline)
+        manifest["files"] = {}
 
-            if preamble_end_index != -1:
+        self.prefixes = {}
+        self.exports = {}
+        self.export_sources = {}
+        self.timings = {}
+        self.counters = {}
+        self.command_timings = {}
+        pending_imports = []
+        processed_files = []
+        imported_types = set()
+        roottex_path = None
+        roottex_entry = None
+        roottex_reprocessed = False
+
+        rdftexpaths = sorted(glob.glob(f"{project_path}/*.rdf.tex"))
+        texts = {}
+
+        for rdftexpath in rdftexpaths:
+            with self.__timed("parse"), open(rdftexpath, "r") as file:
+                texts[rdftexpath] = file.read()
+
+        # Prefix scoping: the prefixes defined in the root file are global, i.e., they apply to
+        # every other file, while the prefixes defined in any other file only apply to that file.
+        # Within a file, prefixes apply from their definition onwards and override global ones.
+        # Hence, the root file is preprocessed first and all other files independently.
+        root_candidates = [rdftexpath for rdftexpath in rdftexpaths if "\\begin{document}" in texts[rdftexpath]]
+        other_paths = [rdftexpath for rdftexpath in rdftexpaths if rdftexpath not in root_candidates]
+
+        with self.__timed("parse"):
+            skipped_files, reprocessed_files = self.__preprocess_files(
+                root_candidates, texts, {}, previous_files, root_cache_path, make_imports, make_exports)
+
+        for rdftexpath in root_candidates:
+            if rdftexpath in skipped_files:
+                if skipped_files[rdftexpath]["root"]:
+                    self.prefixes.update(skipped_files[rdftexpath]["prefixes"])
+            elif reprocessed_files[rdftexpath]["preamble_end_index"] != -1:
+                self.prefixes.update(reprocessed_files[rdftexpath]["prefixes"])
+
+        with self.__timed("parse"):
+            other_skipped_files, other_reprocessed_files = self.__preprocess_files(
+                other_paths, texts, self.prefixes, previous_files, root_cache_path, make_imports, make_exports)
+        skipped_files.update(other_skipped_files)
+        reprocessed_files.update(other_reprocessed_files)
+
+        # merge the results in the order of the paths, independent of the processing order
+        for rdftexpath in rdftexpaths:
+            if rdftexpath in skipped_files:
+                file_entry = skipped_files[rdftexpath]
+
+                self.__merge_exports(rdftexpath, file_entry["exports"], file_entry.get("export_lines", {}))
+                imported_types.update(file_entry["imported_types"])
+                manifest["files"][rdftexpath] = file_entry
+
+                if file_entry["root"]:
+                    roottex_path = rdftexpath.replace(".rdf.tex", ".tex")
+                    roottex_entry = file_entry
+            else:
+                processed_file = reprocessed_files[rdftexpath]
+                processed_files.append(processed_file)
+
+                self.__count("lines_scanned", processed_file["lines"])
+                for kind, count in processed_file["command_counts"].items():
+                    self.__count(f"{kind}_commands", count)
+                    self.command_timings[kind] = self.command_timings.get(kind, 0) + processed_file["command_seconds"][kind]
+
+                self.__merge_exports(rdftexpath, processed_file["exports"], processed_file["export_lines"])
+                pending_imports.extend(
+                    (processed_file, *contribution_import) for contribution_import in processed_file["imports"])
+
+        # resolve the imports of all reprocessed files at once
+        failed_imports = 0
+
+        if pending_imports:
+            if not self.snippet_cache:
+                self.snippet_cache = SnippetCache(f"{project_path}{IMPORT_CACHE_DIR}")
+
+            with self.__timed("imports"):
+                failed_imports = self.__resolve_imports(pending_imports, self.snippet_cache, refresh, offline)
+
+        for processed_file in processed_files:
+            rdftexpath = processed_file["path"]
+            texpath = rdftexpath.replace(".rdf.tex", ".tex")
+            imported_types.update(processed_file["imported_types"])
+
+            manifest["files"][rdftexpath] = {
+                "hash": processed_file["hash"],
+                "prefixes_in": processed_file["prefixes_in"],
+                "prefixes": processed_file["prefixes"],
+                "exports": processed_file["exports"],
+                "export_lines": processed_file["export_lines"],
+                "imported_types": sorted(processed_file["imported_types"]),
+                "scikg_versions": {skg: self.scikg_versions.get(skg) for *_, skg in processed_file["imports"]},
+                "complete": processed_file["complete"],
+                "root": processed_file["preamble_end_index"] != -1,
+            }
+
+            if processed_file["preamble_end_index"] != -1:
                 logging.info(f"Identified {rdftexpath} as root file...")
-                roottex_path = rdftexpath.replace(".rdf.tex", ".tex")
-                roottex_lines = processed_lines
-                roottex_preamble_endindex = preamble_end_index
+                roottex_path = texpath
+                roottex_entry = manifest["files"][rdftexpath]
+                roottex_reprocessed = True
+
+                # keep the processed root file with a placeholder for the custom environments for later runs
+                with self.__timed("write"):
+                    self.__write_chunks(root_cache_path, processed_file["chunks"])
             else:
-                texpath = rdftexpath.replace(".rdf.tex", ".tex")
                 logging.info(f"Writing tex file at {texpath}...")
+                with self.__timed("write"):
+                    self.__write_chunks(texpath, processed_file["chunks"])
+
+        # add custom LaTeX environments to root file if it was reprocessed or the imported types changed
+        if roottex_path and (roottex_reprocessed or roottex_entry.get("env_types") != sorted(imported_types)):
+            with self.__timed("env_snippets"):
+                custom_envs = retrieve_env_snippets(sorted(imported_types), "MinSKG", offline) if imported_types else {}
+            env_types = sorted(imported_types)
+
+            if custom_envs is None:
+                logging.warning("Custom environments not cached (offline mode) -> Skipping custom environments")
+                custom_envs = {}
+                # retry in the next run
+                env_types = None
+
+            logging.info(f"Adding custom environments to {roottex_path}...")
+            with self.__timed("write"), open(root_cache_path, "r") as file:
+                self.__write_chunks(
+                    roottex_path,
+                    ("".join(custom_envs.values()) if line == CUSTOM_ENVS_PLACEHOLDER else line for line in file))
+            roottex_entry["env_types"] = env_types
+
+        # validate exports and generate/store exports RDF document if the exports changed
+        exports_path = f"{project_path}{os.path.splitext(EXPORTS_RDF_DOCUMENT_FILE)[0]}.{export_format}"
+        if compress_exports:
+            exports_path += ".gz"
+        exports_hash = self.__hash(json.dumps([export_format, bool(compress_exports), list(self.exports.items())]))
+
+        # refresh fetches the contribution schema again and revalidates the unchanged exports
+        if not refresh and manifest.get("exports_hash") == exports_hash and os.path.exists(exports_path):
+            logging.info(f"Skipping unchanged exports in {exports_path}...")
+        else:
+            schema_path = f"{project_path}{CONTRIBUTION_SCHEMA_FILE}"
+
+            if self.__export(manifest["publication"], exports_path, export_format, compress_exports,
+                             schema_path, refresh, offline):
+                manifest["exports_hash"] = exports_hash
+
+        with open(manifest_path, "w+") as file:
+            json.dump(manifest, file)
+
+        store_response_cache(f"{project_path}{RESPONSE_CACHE_FILE}")
+
+        self.manifest = manifest
+        self.manifest_mtime = os.stat(manifest_path).st_mtime_ns
+
+        self.summary = {
+            "project": project_path,
+            "files": len(manifest["files"]),
+            "reprocessed_files": len(processed_files),
+            "incomplete_files": sum(not file_entry["complete"] for file_entry in manifest["files"].values()),
+            "imports": len(pending_imports),
+            "failed_imports": failed_imports,
+            "exports": len(self.exports),
+            "seconds": time.time() - start_time,
+            "timings": dict(self.timings),
+            "command_timings": dict(self.command_timings),
+            "counters": dict(self.counters),
+            "http": self.__http_stats_since(http_stats_before),
+        }
+
+        logging.info(f"Reprocessed {len(processed_files)} of {len(manifest['files'])} file(s)...")
+        logging.info(f"Phase timings: {', '.join(f'{phase} {seconds:.4f}s' for phase, seconds in self.timings.items())}...")
+        logging.info(f"Preprocessing took {self.summary['seconds']} seconds!")
+
+    @staticmethod
+    def __http_stats_since(http_stats_before) -> dict:
+        """
+        Returns the HTTP requests, transferred bytes and response times per SciKG endpoint
+        since the specified snapshot of the adapter's statistics.
+        """
 
-                with open(texpath, "w+") as file:
-                    file.writelines(processed_lines)
+        http_stats_since = {}
 
-        # add custom LaTeX environments to root file
-        custom_envs = retrieve_env_snippets(imported_types, "MinSKG")
-        for env in custom_envs.values():
-            roottex_lines.insert(roottex_preamble_endindex, env)
+        for endpoint, stats in list(http_stats.items()):
+            before = http_stats_before.get(endpoint, {})
 
-        logging.info(f"Adding custom environments to {roottex_path}...")
-        with open(roottex_path, "w+") as file:
-            file.writelines(roottex_lines)
+            if stats["requests"] != before.get("requests", 0):
+                http_stats_since[endpoint] = {key: value - before.get(key, 0) for key, value in stats.items()}
 
-        # validate exports and generate/store exports RDF document
-        validated_exports = retrieve_validated_exports(self.exports)
-        
-        exports_graph = Graph()
-        terms = Namespace("https://example.org/scikg/terms/")
-        publ = Namespace("https://example.org/scikg/publications/")
+        return http_stats_since
 
-        publication_uri = publ[f"NEW/{uuid.uuid4().hex}"]
-        new_publication = URIRef(publication_uri)
-        export_ctr = 0
+    def __export(self, publication_id, exports_path, export_format, compress_exports,
+                 schema_path, refresh, offline) -> bool:
+        """
+        Validates the exports locally against the cached contribution schema and streams
+        them to the exports RDF document. Returns False if the exports could not be validated.
+        """
 
-        for _, predicate_object_tuples in validated_exports.items():
-            contrib_uri = URIRef(
-                f"{publication_uri}/contrib{export_ctr}")
+        with self.__timed("validation"):
+            schema = retrieve_contribution_schema(schema_path, refresh, offline)
 
-            exports_graph.add(
-                (new_publication, terms["has_contribution"], contrib_uri))
+        if schema is None:
+            logging.warning("No contribution schema cached (offline mode) -> Skipping exports")
+            return False
 
-            for pred, obj in predicate_object_tuples:
-                exports_graph.add(
-                    (contrib_uri, URIRef(pred), Literal(obj)))
+        with self.__timed("validation"):
+            validated_exports = ExportValidator(schema).validate(self.exports, self.export_sources)
 
-            export_ctr += 1
+        publication_uri = f"https://example.org/scikg/publications/NEW/{publication_id}"
+        export_ctr = 0
 
-        with open(f"{TEX_DIR}{PROJECT_DIR}{EXPORTS_RDF_DOCUMENT_FILE}", "w+") as file:
-            file.write(exports_graph.serialize(format="ttl"))
+        with self.__timed("serialization"), ExportWriter(exports_path, export_format, compress_exports) as writer:
+            for _, predicate_object_tuples in validated_exports.items():
+                writer.add_contribution(publication_uri, f"{publication_uri}/contrib{export_ctr}", predicate_object_tuples)
+                export_ctr += 1
+
+        if not writer.changed:
+            logging.info(f"Skipping unchanged {exports_path}...")
 
         logging.info(
-            f"{export_ctr} contribution(s) successfully exported to {TEX_DIR}{PROJECT_DIR}{EXPORTS_RDF_DOCUMENT_FILE}...")
+            f"{export_ctr} contribution(s) successfully exported to {exports_path}...")
 
-        logging.info(f"Preprocessing took {time.time() - start_time} seconds!")
+        return True
 
     def watch(self) -> None:
         """
         Issues the preprocessing if changes are made to the .rdf.tex files in the specified
         project directory. Note that this only works on Linux properly
         (s. https://william-yeh.net/post/2019/06/inotify-in-containers/).
+
+        Events are collected and debounced, so that the several events an editor emits per
+        save only trigger a single run. Runs are issued by a single worker thread and thus
+        never overlap, while the manifest, the import cache and the HTTP connections stay
+        warm between them.
         """
 
-        def on_created(event):
-            logging.info(
-                f"{event.src_path} has been created -> Preprocessing...")
-            self.run()
-            logging.info(
-                "=== Watching for updated .rdf.tex files. Use ctrl/C to stop ...")
+        # watchdog is only needed for the watch mode, so it is not imported for single runs
+        from watchdog.events import PatternMatchingEventHandler
+        from watchdog.observers import Observer
+
+        changed_paths = set()
+        condition = threading.Condition()
+
+        def on_event(event):
+            with condition:
+                changed_paths.add(getattr(event, "dest_path", "") or event.src_path)
+                condition.notify()
+
+        def build_worker():
+            while True:
+                with condition:
+                    while not changed_paths:
+                        condition.wait()
+
+                    # wait until no further events arrive within the debounce interval
+                    while condition.wait(WATCH_DEBOUNCE_SECONDS):
+                        pass
+
+                    paths = sorted(changed_paths)
+                    changed_paths.clear()
+
+                logging.info(f"{', '.join(paths)} changed -> Preprocessing...")
 
-        def on_modified(event):
-            logging.info(
-                f"{event.src_path} has been modified -> Preprocessing...")
-            self.run()
-            logging.info(
-                "=== Watching for updated .rdf.tex files. Use ctrl/C to stop ...")
+                try:
+                    self.run()
+                except Exception as e:
+                    logging.error(f"Preprocessing failed: {e}")
 
-        def on_moved(event):
-            logging.info(
-                f"{event.src_path} moved to {event.dest_path} -> Preprocessing...")
-            self.run()
-            logging.info(
-                "=== Watching for updated .rdf.tex files. Use ctrl/C to stop ...")
+                logging.info(
+                    "=== Watching for updated .rdf.tex files. Use ctrl/C to stop ...")
 
         event_handler = PatternMatchingEventHandler(
             patterns=["*.rdf.tex"],
@@ -340,12 +811,14 @@ class Preprocessor:
             ignore_directories=True,
             case_sensitive=True)
 
-        event_handler.on_created = on_created
-        event_handler.on_modified = on_modified
-        event_handler.on_moved = on_moved
+        event_handler.on_created = on_event
+        event_handler.on_modified = on_event
+        event_handler.on_moved = on_event
 
         observer = Observer()
-        observer.schedule(event_handler, TEX_DIR, recursive=True)
+        observer.schedule(event_handler, self.project_path, recursive=False)
+
+        threading.Thread(target=build_worker, daemon=True).start()
 
         logging.info(
             "=== Watching for updated .rdf.tex files. Use ctrl/C to stop ...")
@@ -357,7 +830,99 @@ class Preprocessor:
             observer.stop()
             observer.join()
 
+    def serve(self) -> None:
+        """
+        Runs the preprocessor as a daemon that accepts runs from the client (s. client.py)
+        on a Unix socket in the project directory, so that builds do not pay the interpreter
+        startup, the imports and cold caches and connections. Every request carries the
+        options of its run and is answered with the summary of the run.
+
+        Runs are handled one at a time, while the manifest, the import cache, the prefix
+        patterns and the HTTP connections stay warm between them.
+        """
+
+        import signal
+        import socket
+        import socketserver
+
+        socket_path = f"{self.project_path}{DAEMON_SOCKET_FILE}"
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+        if os.path.exists(socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                try:
+                    client.connect(socket_path)
+                except OSError:
+                    # left behind by a daemon that was killed
+                    os.remove(socket_path)
+                else:
+                    logging.error(f"A preprocessor daemon is already listening on {socket_path}")
+                    return
+
+        preprocessor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+
+                # connections without a request, e.g., of another daemon checking for this one
+                if not line:
+                    return
+
+                try:
+                    request = json.loads(line)
+                    command = request.get("command")
+                except (ValueError, AttributeError):
+                    request, command = {}, None
+
+                if command == "stop":
+                    logging.info("=== Stopping the preprocessor daemon ...")
+                    response = {"stopped": True}
+                    # shutdown blocks until the serve loop, which is handling this request, returns
+                    threading.Thread(target=self.server.shutdown).start()
+
+                elif command == "run":
+                    try:
+                        preprocessor.run(**request.get("options", {}))
+                        response = {"summary": preprocessor.summary}
+                    except Exception as e:
+                        logging.error(f"Preprocessing failed: {e}")
+                        response = {"error": f"{type(e).__name__}: {e}"}
+
+                else:
+                    response = {"error": f"Unsupported request {request}"}
+
+                try:
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                except BrokenPipeError:
+                    logging.warning("Client disconnected before the run completed")
+
+        # stop on SIGTERM like on ctrl/C, so that the socket is removed
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        with socketserver.UnixStreamServer(socket_path, Handler) as server:
+            logging.info(f"=== Preprocessor daemon listening on {socket_path}. Use ctrl/C to stop ...")
+
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_path)
+
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    fire.Fire(Preprocessor().run)
+
+    # fire is only imported to parse arguments, so that the plain invocation used by Latexmk starts faster
+    if len(sys.argv) == 1:
+        Preprocessor().run()
+    else:
+        import fire
+
+        if sys.argv[1:2] == ["watch"]:
+            fire.Fire(Preprocessor().watch, command=sys.argv[2:])
+        elif sys.argv[1:2] == ["serve"]:
+            fire.Fire(Preprocessor().serve, command=sys.argv[2:])
+        else:
+            fire.Fire(Preprocessor().run)
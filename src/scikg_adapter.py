@@ -1,33 +1,189 @@
 """Adapter module for interacting with SciKGs."""
 
-import requests
-from constants import EXPORTS_SCIKG
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
-def get_tree_for_contribution_entity(entity, skg):
+from constants import (CONTRIBUTION_SCHEMA_VERSION, EXPORTS_SCIKG, MAX_CONCURRENT_REQUESTS,
+                       RESPONSE_CACHE_SIZE, SCIKG_URLS)
+
+# shared session that keeps pooled keep-alive connections to the SciKGs, created on first use
+_session = None
+_session_lock = threading.Lock()
+
+# requests, transferred bytes and response times (until the headers are received) per SciKG endpoint
+http_stats = {}
+_http_stats_lock = threading.Lock()
 
-    query = f"""
+# base URLs of the SciKGs, which can be redirected (e.g., to a local stand-in for benchmarks)
+scikg_urls = dict(SCIKG_URLS)
+
+# query template for the tree-like contribution data below ?subject
+CONTRIBUTION_TREE_QUERY = """
     prefix x: <urn:ex:>
 
-    construct {{?s ?p ?o}}
-    where {{
-      <{entity}> (x:|!x:)* ?s .
+    construct {?s ?p ?o}
+    where {
+      ?subject (x:|!x:)* ?s .
       ?s ?p ?o .
-    }}
+    }
+    """
+
+# ETags and bodies of previous GET responses for conditional requests of the project whose
+# response cache file is loaded
+response_cache = {}
+response_cache_path = None
+
+
+def get_session():
+    """
+    Returns the shared session. Requests is only imported once a SciKG is contacted, so
+    that runs without imports or with cached responses do not pay for its import.
+    """
+
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+            _session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+            _session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+            _session.hooks["response"].append(record_http_stats)
+
+    return _session
+
+
+def record_http_stats(response, *args, **kwargs) -> None:
+    """
+    Adds a response of the shared session to the statistics of its endpoint.
+    """
+
+    url = urlsplit(response.url)
+
+    with _http_stats_lock:
+        stats = http_stats.setdefault(
+            f"{url.netloc}{url.path}", {"requests": 0, "not_modified": 0, "errors": 0, "bytes": 0, "seconds": 0})
+        stats["requests"] += 1
+        stats["not_modified"] += response.status_code == 304
+        stats["errors"] += response.status_code >= 400
+        stats["bytes"] += len(response.content)
+        stats["seconds"] += response.elapsed.total_seconds()
+
+
+def load_response_cache(path) -> None:
+    """
+    Loads the responses of previous runs of a project for conditional requests unless they
+    are already loaded. The responses of the previously loaded project are discarded, so
+    that they neither leak into the cache file of this project nor accumulate in processes
+    preprocessing many projects, e.g., batch workers.
+    """
+
+    global response_cache_path
+
+    if path == response_cache_path:
+        return
+
+    response_cache.clear()
+    response_cache_path = path
+
+    try:
+        with open(path, "r") as file:
+            response_cache.update(json.load(file))
+    except (OSError, ValueError):
+        pass
+
+
+def store_response_cache(path) -> None:
+    """
+    Stores the responses for conditional requests in later runs.
+    """
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w+") as file:
+        json.dump(response_cache, file)
+
+    os.replace(tmp_path, path)
+
+
+def conditional_get(url, params=None, offline=False) -> str:
+    """
+    Issues a GET request and returns the response body. If a previous response carried an
+    ETag, the request is made conditional and the previous body is reused if the SciKG
+    responds with 304, so that nothing is transferred if the SciKG did not change.
+
+    If offline is set, no request is sent and the previous body is returned, or None if
+    there is no previous response.
+    """
+
+    key = json.dumps([url, sorted((params or {}).items())])
+    cached = response_cache.get(key)
+
+    if offline:
+        return cached["body"] if cached else None
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+
+    response = get_session().get(url, params=params, headers=headers)
+
+    if response.status_code == 304 and cached:
+        return cached["body"]
+
+    response.raise_for_status()
+
+    if "ETag" in response.headers:
+        if len(response_cache) >= RESPONSE_CACHE_SIZE:
+            # drop the oldest entry
+            del response_cache[next(iter(response_cache))]
+
+        response_cache[key] = {"etag": response.headers["ETag"], "body": response.text}
+
+    return response.text
+
+
+def map_concurrently(function, items, max_workers=MAX_CONCURRENT_REQUESTS) -> list:
+    """
+    Applies the function to the items using a bounded number of threads. Returns the
+    results in the order of the items, where failed calls are represented by the raised
+    exception so that errors are isolated per item.
     """
 
-    payload = {"query": query}
+    def isolated(item):
+        try:
+            return function(item)
+        except Exception as e:
+            return e
+
+    items = list(items)
+
+    if len(items) < 2:
+        return [isolated(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(isolated, items))
+
+
+def get_tree_for_contribution_entity(entity, skg):
 
     if skg == "MinSKG":
-        response = requests.get("http://localhost:5000/query", params=payload)
+        # the MinSKG binds the subject to the prepared template instead of parsing a query per entity
+        payload = {"query": CONTRIBUTION_TREE_QUERY, "subject": entity}
+        response = get_session().get(f"{scikg_urls['MinSKG']}/query", params=payload)
 
     elif skg == "ORKG":
-        response = requests.get("https://orkg.org/triplestore", params=payload)
+        payload = {"query": CONTRIBUTION_TREE_QUERY.replace("?subject", f"<{entity}>")}
+        response = get_session().get(f"{scikg_urls['ORKG']}/triplestore", params=payload)
 
     else:
         raise NotImplementedError("Only the MinSKG and the ORKG are currently for querying the tree-like contribution data.")
 
+    response.raise_for_status()
+
     return response
 
+
 def retrieve_content_snippet(label: str, citation_key: str, contribution_iri: str, skg: str) -> str:
     """
     Generates a LaTeX snippet based on the specified contribution data, import label,
@@ -36,7 +192,7 @@ def retrieve_content_snippet(label: str, citation_key: str, contribution_iri: st
 
     if skg == "MinSKG":
         payload = {"label": label, "citation_key": citation_key, "contribution_iri": contribution_iri, "skg": skg}
-        response = requests.get("http://localhost:5000/content_snippet", params=payload).json()
+        response = json.loads(conditional_get(f"{scikg_urls['MinSKG']}/content_snippet", params=payload))
 
         content_snippet = response["content_snippet"]
         contribution_type = response["contribution_type"]
@@ -46,10 +202,58 @@ def retrieve_content_snippet(label: str, citation_key: str, contribution_iri: st
     return content_snippet, contribution_type
 
 
-def retrieve_env_snippets(imported_types, skg):
+def retrieve_content_snippets(imports: list, skg: str) -> list:
+    """
+    Generates the LaTeX snippets for a batch of (label, citation_key, contribution_iri)
+    imports with a single request. Returns a list in the order of the imports holding
+    either a (content_snippet, contribution_type) tuple or the exception raised for the
+    respective import. If the MinSKG lacks the batch endpoint (e.g., an older version), the
+    snippets are requested concurrently with one request per import.
+    """
+
     if skg == "MinSKG":
-        response = requests.get("http://localhost:5000/env_snippets").json()
+        payload = [{"label": label, "citation_key": citation_key, "contribution_iri": contribution_iri}
+                   for label, citation_key, contribution_iri in imports]
+        response = get_session().post(f"{scikg_urls['MinSKG']}/content_snippets", json=payload)
+
+        if response.status_code != 404:
+            response.raise_for_status()
+
+            return [(result["content_snippet"], result["contribution_type"]) if "error" not in result
+                    else Exception(result["error"]) for result in response.json()]
+
+    return map_concurrently(lambda contribution_import: retrieve_content_snippet(*contribution_import, skg), imports)
+
+
+def retrieve_scikg_version(skg, offline=False):
+    """
+    Returns the version of the SciKG, which changes whenever it is rebuilt. The version is
+    requested conditionally and thus costs a 304 if it did not change. If offline is set,
+    the version of the previous runs is returned, or None if there is none.
+    """
 
+    if skg == "MinSKG":
+        body = conditional_get(f"{scikg_urls['MinSKG']}/version", offline=offline)
+    else:
+        raise NotImplementedError("Only the MinSKG is currently supported for importing contributions.")
+
+    return json.loads(body)["version"] if body is not None else None
+
+
+def retrieve_env_snippets(imported_types, skg, offline=False):
+    """
+    Returns the custom LaTeX environments of the imported contribution types. If offline
+    is set, they are only served from the responses of previous runs and None is returned
+    if there is none.
+    """
+
+    if skg == "MinSKG":
+        body = conditional_get(f"{scikg_urls['MinSKG']}/env_snippets", offline=offline)
+
+        if body is None:
+            return None
+
+        response = json.loads(body)
         required_custom_envs = {key: response[key] for key in imported_types if key in response}
     else:
         raise NotImplementedError("Only the MinSKG is currently supported for importing contributions.")
@@ -57,10 +261,41 @@ def retrieve_env_snippets(imported_types, skg):
     return required_custom_envs
 
 
-def retrieve_validated_exports(exports):
+def retrieve_contribution_schema(path, refresh=False, offline=False):
+    """
+    Returns the contribution schema of the exports SciKG, i.e., the supported contribution
+    types and their required predicates. The schema is stored at the path and only fetched
+    again if refresh is set or if the stored schema has another version. Returns None if
+    offline is set and no schema is stored.
+    """
+
+    if not refresh or offline:
+        try:
+            with open(path, "r") as file:
+                schema = json.load(file)
+        except (OSError, ValueError):
+            schema = None
+
+        if schema and schema.get("version") == CONTRIBUTION_SCHEMA_VERSION:
+            return schema
+
+    if offline:
+        return None
+
     if EXPORTS_SCIKG == "MinSKG":
-        validated_exports = requests.post("http://localhost:5000/validated_exports", json=exports).json()
+        response = get_session().get(f"{scikg_urls['MinSKG']}/contribution_schema")
+        response.raise_for_status()
+        schema = response.json()
     else:
-        raise NotImplementedError("Only the MinSKG is currently supported for importing contributions.")
+        raise NotImplementedError("Only the MinSKG is currently supported for exporting contributions.")
+
+    if schema.get("version") != CONTRIBUTION_SCHEMA_VERSION:
+        raise ValueError(f"Unsupported contribution schema version {schema.get('version')}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w+") as file:
+        json.dump(schema, file)
+
+    os.replace(tmp_path, path)
 
-    return validated_exports
+    return schema
@@ -0,0 +1,118 @@
+"""Persistent cache for imported content snippets."""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from constants import (IMPORT_CACHE_MAX_BYTES, IMPORT_CACHE_TTL,
+                       SNIPPET_TEMPLATE_VERSION)
+
+
+class SnippetCache:
+    """
+    Content-addressed on-disk cache for the content snippets of imported contributions.
+    Entries expire after a TTL and the least recently used entries are evicted once the
+    cache exceeds its size limit.
+    """
+
+    def __init__(self, cache_dir: str, ttl=IMPORT_CACHE_TTL, max_bytes=IMPORT_CACHE_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(skg, contribution_iri, label, citation_key) -> str:
+        """
+        Returns the cache key of an import.
+        """
+
+        key_data = json.dumps([skg, contribution_iri, label, citation_key, SNIPPET_TEMPLATE_VERSION])
+
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def __path(self, key) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key, allow_expired=False, version=None):
+        """
+        Returns the cached (content_snippet, contribution_type) tuple or None on a miss.
+        Expired entries are only returned if allow_expired is set. If the version of the
+        SciKG is given, entries generated from another version are misses.
+        """
+
+        path = self.__path(key)
+
+        try:
+            with open(path, "r") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if ((not allow_expired and time.time() - entry["created"] > self.ttl)
+                or (version is not None and entry.get("version") != version)):
+            self.misses += 1
+            return None
+
+        # the modification time tracks the last access for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted concurrently, e.g., by another batch worker sharing the cache
+            pass
+        self.hits += 1
+
+        return entry["content_snippet"], entry["contribution_type"]
+
+    def put(self, key, content_snippet, contribution_type, version=None) -> None:
+        """
+        Stores a content snippet generated from the specified version of the SciKG atomically.
+        """
+
+        entry = {
+            "content_snippet": content_snippet, "contribution_type": contribution_type, "version": version,
+            "created": time.time()}
+
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(entry, file)
+
+        os.replace(tmp_path, self.__path(key))
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits its size limit.
+        """
+
+        entries = []
+
+        with os.scandir(self.cache_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.name.endswith(".json"):
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            total_bytes -= size
+            logging.info(f"Evicted {path} from the import cache...")
@@ -0,0 +1,131 @@
+"""Stand-in module for SciKGs that replays recorded responses with simulated latencies."""
+
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# latency distributions parameterized by their mean and spread in seconds
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "normal", "lognormal", "exponential"]
+
+
+def recording_key(url) -> str:
+    """
+    Returns the key of a recorded response, i.e., the path and query of the request URL.
+    """
+
+    url = urlsplit(url)
+
+    return f"{url.path}?{url.query}" if url.query else url.path
+
+
+def load_recordings(path) -> dict:
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def store_recordings(path, recordings) -> None:
+    with open(path, "w+") as file:
+        json.dump(recordings, file, indent=2)
+
+
+class LatencyModel:
+    """
+    Draws simulated response latencies from a distribution with the specified mean and
+    spread (half-width for "uniform", standard deviation for "normal" and "lognormal").
+    The draws are seeded, so that repeated benchmarks simulate the same latencies.
+    """
+
+    def __init__(self, distribution="lognormal", mean=0.1, spread=0.05, seed=0) -> None:
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise NotImplementedError(f"Only the latency distributions {', '.join(LATENCY_DISTRIBUTIONS)} are supported.")
+
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self) -> float:
+        with self.lock:
+            if self.distribution == "constant" or self.mean <= 0:
+                latency = self.mean
+            elif self.distribution == "uniform":
+                latency = self.random.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.distribution == "normal":
+                latency = self.random.gauss(self.mean, self.spread)
+            elif self.distribution == "lognormal":
+                # parameters of the underlying normal distribution yielding the specified mean and standard deviation
+                sigma = math.sqrt(math.log(1 + (self.spread / self.mean) ** 2))
+                latency = self.random.lognormvariate(math.log(self.mean) - sigma ** 2 / 2, sigma)
+            else:
+                latency = self.random.expovariate(1 / self.mean)
+
+        return max(latency, 0)
+
+
+class StandInSciKG:
+    """
+    Local HTTP server standing in for a SciKG. Replays the recorded responses for the
+    requested paths and queries after a latency drawn from the latency model, so that the
+    response times of the adapter can be benchmarked offline and reproducibly. Unknown
+    requests are answered with 404. Use as a context manager, which yields the base URL.
+    """
+
+    def __init__(self, recordings: dict, latency_model: LatencyModel, port=0) -> None:
+        self.recordings = recordings
+        self.latency_model = latency_model
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.__handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        logging.info(f"Stand-in SciKG with {len(self.recordings)} recorded response(s) listening at {self.url}...")
+
+        return self.url
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def __handler(self):
+        recordings = self.recordings
+        latency_model = self.latency_model
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are sent in separate writes, which Nagle's algorithm would delay by
+            # the client's delayed ACK (~40 ms) on kept-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                recording = recordings.get(recording_key(self.path))
+                time.sleep(latency_model.draw())
+
+                if recording is None:
+                    status, content_type, body = 404, "text/plain", b"No recorded response"
+                else:
+                    status, content_type, body = recording["status"], recording["content_type"], recording["body"].encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
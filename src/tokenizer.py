@@ -0,0 +1,135 @@
+"""Tokenizer module for RDFtex documents."""
+
+import functools
+import re
+from typing import Iterator, NamedTuple
+
+TEXT = "text"
+DOCUMENT = "document"
+PREFIX = "rdfprefix"
+IMPORT = "rdfimport"
+EXPORT = "rdfexport"
+PROPERTY = "rdfproperty"
+
+# Block commands (prefix, import, export) replace the whole line they occur on and are only
+# recognized if they are not preceded by a space. Properties are replaced inline.
+_COMMAND_PATTERN = re.compile(
+    r"^[^\n]*?(?<! )\\(?P<block>rdfprefix|rdfimport|rdfexport)"
+    r"|\\(?P<property>rdfproperty)"
+    r"|(?P<document>\\begin\{document\})",
+    re.MULTILINE)
+_BRACE_PATTERN = re.compile(r"[{}]")
+_PARAMS_START_PATTERN = re.compile(r"[ \t]*\{")
+
+
+class Token(NamedTuple):
+    """
+    A span of an RDFtex document. Offsets are character offsets into the document text,
+    line numbers are 1-based.
+    """
+
+    kind: str
+    start: int
+    end: int
+    line: int
+    params: tuple = ()
+
+
+def parse_params(text: str, pos: int) -> tuple:
+    """
+    Parses the brace-delimited parameters of a command starting at pos and returns them
+    together with the offset after the last complete parameter. Parameters may span
+    multiple lines but have to follow each other immediately.
+    """
+
+    params = []
+
+    match = _PARAMS_START_PATTERN.match(text, pos)
+    if not match:
+        return tuple(params), pos
+
+    param_start = match.end() - 1
+
+    while param_start < len(text) and text[param_start] == "{":
+        depth = 0
+
+        for brace in _BRACE_PATTERN.finditer(text, param_start):
+            depth += 1 if brace.group() == "{" else -1
+
+            if not depth:
+                params.append(text[param_start + 1:brace.start()])
+                pos = param_start = brace.end()
+                break
+        else:
+            # unterminated parameter, keep the complete ones
+            break
+
+    return tuple(params), pos
+
+
+def tokenize(text: str) -> Iterator[Token]:
+    """
+    Scans an RDFtex document once and yields its command tokens and the plain text spans
+    in between in document order. A zero-length document token marks the start of the
+    line containing \\begin{document}.
+    """
+
+    emitted_end = 0
+    search_pos = 0
+    line = 1
+    counted_end = 0
+
+    def line_at(offset):
+        nonlocal line, counted_end
+        line += text.count("\n", counted_end, offset)
+        counted_end = offset
+        return line
+
+    while True:
+        match = _COMMAND_PATTERN.search(text, search_pos)
+
+        if not match:
+            break
+
+        if match.group("document"):
+            start = max(text.rfind("\n", 0, match.start()) + 1, emitted_end)
+            token = Token(DOCUMENT, start, start, 0)
+            search_pos = match.end()
+
+        elif match.group("block"):
+            start = match.start()
+            params, params_end = parse_params(text, match.end("block"))
+            line_end = text.find("\n", params_end)
+            end = len(text) if line_end == -1 else line_end + 1
+            token = Token(match.group("block"), start, end, 0, params)
+            search_pos = end
+
+        else:
+            start = match.start()
+            params, end = parse_params(text, match.end("property"))
+            token = Token(PROPERTY, start, end, 0, params)
+            search_pos = end
+
+        if token.start > emitted_end:
+            yield Token(TEXT, emitted_end, token.start, line_at(emitted_end))
+
+        yield token._replace(line=line_at(token.start))
+        emitted_end = token.end
+
+    if emitted_end < len(text):
+        yield Token(TEXT, emitted_end, len(text), line_at(emitted_end))
+
+
+@functools.lru_cache(maxsize=64)
+def compile_prefix_pattern(prefixes: tuple) -> re.Pattern:
+    """
+    Compiles a pattern that matches a CURIE (prefix:reference) with one of the prefixes at
+    the start of a string. Longer prefixes are tried first.
+    """
+
+    if not prefixes:
+        return re.compile(r"(?!)")
+
+    alternation = "|".join(map(re.escape, sorted(prefixes, key=len, reverse=True)))
+
+    return re.compile(rf"(?P<prefix>{alternation}):")